@@ -1,159 +1,280 @@
-import re
-
 import wp.template
 from wp.parser import Parser
-from scope import Scope
+from scope import Scope, HelperTable
 from wp.types import ctypes
 from wp import template
+from wp.emitter import Emitter
+from wp import stats
 
 def argchecker(fn):
     	"""
-		Decorator called from within operations to discover 
-		the local variables' types of function parameters for a scope's function definition
+		Decorator called from within operations to check the types of their arguments
+		(see Argument.infer)
 		Checks:
 			- all args have the same type (or some have NONE)
 			- atleast 1 argument has a type (other can have NONE)
 	"""
-	def _get_type(args):
+	def _get_type(types):
 		#Get the return type of the arguments
 		_type = None
- 		for arg in args:
- 			if arg.type() == ctypes.NONE:
- 				continue
- 			if _type and _type != arg.type():
- 				raise Exception("Comparison between different type variables")
- 			_type = arg.type()
+		for arg_type in types:
+			if arg_type == ctypes.NONE:
+				continue
+			if _type and _type != arg_type:
+				raise Exception("Comparison between different type variables")
+			_type = arg_type
 		return _type
 
 
 	def inner(self):
-		_type = _get_type(self.all_args)
- 		if _type == ctypes.NONE:
- 			raise Exception("Comparison With Unknown variables")
-
- 		for arg in self.all_args:
- 			if arg.type() == ctypes.NONE:
- 				var = self.scope.get_variable(arg.compile()) # argument is stored in the scope 
- 				self.scope.add(arg.compile(), _type, var.value) # we need its value
+		_type = _get_type([arg.infer() for arg in self.all_args])
+		if _type is None:
+			raise Exception("Comparison With Unknown variables")
 
- 		return fn(self)
+		return fn(self)
 
 	
- 	return inner
+	return inner
+
 
 
+class Node(type):
+	"""
+		Metaclass of the Argument hierarchy, every node class gets __slots__ 
+		(empty unless the class declares its own), so no node carries a __dict__
+	"""
+	def __new__(mcs, name, bases, attrs):
+		attrs.setdefault("__slots__", ())
+		return type.__new__(mcs, name, bases, attrs)
+
 
-class Argument:
-	def __init__(self, args, scope=Scope()):
-		self.callable = False
+class Argument(object):
+	__metaclass__ = Node
+	__slots__ = ("all_args", "scope")
+
+	# callable arguments compile to a function name, that must be called to get the value
+	callable = False
+
+	def __init__(self, args, scope=None):
 		self.all_args = []
 
-		self.scope = scope 
+		# a program given without a scope gets its own, nothing is shared between compilations
+		self.scope = scope if scope is not None else Scope()
+
+		# args is None when the node is being built by its parent's parser
+		if args is not None:
+			parser = Parser(self.parser_fns())
+			parser.parse(args)
+			self.close()
 
-		parser = Parser({
+	def parser_fns(self):
+		return {
 			"string" : self.find_str,
 			"integer" : self.find_int,
 			"variable": self.find_var,
 			"argument" : self.find_arg, 
-		})
-		parser.parse(args)
+			"close" : self.close,
+		}
 
+	def close(self):
+		"""
+			Called once all the arguments of this form have been parsed
+		"""
+		pass
 
 	def execute(self):
 		return self.all_args[0].execute()
 
+	def resolve(self):
+		"""
+			Resolution pass, run on each top-level form before it's typed,
+			binds the variables to their address in the symbol table of the program,
+			their scope and slot (see scope.SymbolTable), function calls are bound 
+			to their scope when parsed.
+		"""
+		for arg in getattr(self, "all_args", ()):
+			arg.resolve()
+
+	def infer(self):
+		"""
+			Type inference pass, run on each top-level form before it's compiled.
+			Types the arguments and then this node (see type()), the type is stored in 
+			the annotations of the function being compiled (see Scope.annotations),
+			so each node is typed once for each variant and compile() reads it back.
+
+			@returns 	the ctypes value of this node
+		"""
+		annotations = self.scope.annotations()
+		ctype = annotations.get(self)
+		# ctypes.NONE (a recursive call, see ScopeFunction.infer) is typed again
+		if not ctype:
+			for arg in getattr(self, "all_args", ()):
+				arg.infer()
+			ctype = annotations[self] = self.type()
+		return ctype
+
 	def compile(self):
-		main = 	("#include <stdio.h>\n"
-				 "#include <string.h>\n"
-				 "#include \"lisp_def.c\"\n\n"
-				 "//prototype definitions\n"
-				 "{{}}\n\n"
-				 "//variable definitions\n"
-				 "{{}}\n\n"
-				 "//function definitions\n"
-				 "{{}}\n\n" 
-				 "int main() {{{{\n"
-				 "\t{};\n"
-				 "\treturn 0;\n"
-				"}}}}")
-		calls = []
-		for arg in self.all_args:	
-			calls.append(arg.compile(call=True) if arg.callable else arg.compile())
-
-		main_code = main.format(';\n'.join(calls))	
-
-		fns = '\n'.join(self.scope.compile_functions())
-
-		main_code = main_code.format('\n'.join(self.scope.compile_protos()),
-										self.scope.compile_variables(),
-										fns)
-		return main_code
+		return template.program(self.compile_sections())
+
+	def tail_calls(self, function):
+		"""
+			@arg function 	scope.ScopeFunction whose body has this node in tail position
+			@returns 	whether the node calls the function in tail position
+		"""
+		return False
+
+	def compile_tail(self, function):
+		"""
+			Compiles the node, in tail position of the function's body, to C statements 
+			returning its value. The calls to the function itself assign its parameters 
+			and jump back to its start (see ScopeFunction.create), so tail recursion 
+			runs in constant stack.
+		"""
+		if function.ret == ctypes.VOID:
+			return "{}; return;".format(self.compile_form(self))
+		return "return {};".format(self.compile_form(self))
+
+	def compile_sections(self, forms=None, state=None, jobs=1, passes=(), helpers=None):
+		"""
+			Compiles the program into the sections of the C file, see emit for the arguments
+
+			@arg helpers (optional) scope.HelperTable removing the duplicated helpers
+			@returns 	template.Program
+		"""
+		emitter = Emitter(helpers if helpers is not None else HelperTable())
+		self.emit(emitter, forms, state, jobs, passes)
+		return emitter.program()
+
+	def emit(self, emitter, forms=None, state=None, jobs=1, passes=()):
+		"""
+			Compiles the program, writing its code to the emitter (wp.emitter.Emitter)
+
+			@arg forms 	(optional) iterable with the source text of each top-level form
+						(see wp.parser.read_forms), each form is parsed and compiled before 
+						the next one is read and its tree is dropped afterwards, 
+						definitions stay reachable through their scopes.
+						If not given, the arguments already parsed are compiled.
+			@arg state 	(optional) wp.incremental.BuildState, top-level definitions 
+						(given as forms) that didn't change since the previous compilation 
+						reuse its code, the state is updated with the code of this one.
+						Raises scope.StaleFragment if reused code has to be compiled again.
+			@arg jobs 	(optional) number of processes generating the code of the 
+						top-level definitions
+			@arg passes (optional) functions run on each top-level form before it's compiled,
+						they return the form to compile (see optimizer.ConstantFolder)
+		"""
+		definitions = []
+
+		if forms is None:
+			if stats.active():
+				stats.count("nodes", sum(arg.size() for arg in self.all_args))
+			self.all_args[:] = [self.run_passes(arg, passes) for arg in self.all_args]
+			calls = [self.compile_top(arg) for arg in self.all_args]
+		else:
+			calls = []
+			parser = Parser(self.parser_fns())
+
+			for form in forms:
+				with stats.phase("parse"):
+					parser.parse(form)
+				if stats.active():
+					stats.count("nodes", sum(arg.size() for arg in self.all_args))
+				for arg in self.all_args:
+					arg = self.run_passes(arg, passes)
+					if state is not None and isinstance(arg, DefArgument):
+						definitions.append((arg.scope, arg.restore(state, form)))
+					calls.append(self.compile_top(arg))
+				del self.all_args[:]
+				self.scope.types.clear()
+
+		with stats.phase("compile"):
+			if jobs > 1:
+				self.scope.compile_children(jobs)
+
+			# the code of the definitions is saved in the state
+			for scope, digest in definitions:
+				if not scope.fragment:
+					scope.fragment = scope.compile_fragment()
+
+			self.scope.emit(emitter)
+			for call in calls:
+				emitter.call(call)
+
+		if stats.active():
+			for name, value in self.scope.statistics().items():
+				stats.count(name, value)
+
+		for scope, digest in definitions:
+			scope.check_fragment()
+			state.put(scope.name, digest, scope.save(), scope.restored)
+
+	@staticmethod
+	def run_passes(arg, passes):
+		if not passes:
+			return arg
+		with stats.phase("optimize"):
+			for optimization in passes:
+				arg = optimization(arg)
+		return arg
+
+	@staticmethod
+	def compile_top(arg):
+		with stats.phase("resolve"):
+			arg.resolve()
+		with stats.phase("infer"):
+			arg.infer()
+		with stats.phase("compile"):
+			return Argument.compile_form(arg)
+
+	def size(self):
+		"""
+			@returns 	number of nodes of this tree
+		"""
+		return 1 + sum(arg.size() if isinstance(arg, Argument) else 0
+						for arg in getattr(self, "all_args", ()))
+
+	@staticmethod
+	def compile_form(arg):
+		return arg.compile(call=True) if arg.callable else arg.compile()
 
 	def getArgumentClass(self, id_str):
-		argument_types = {
-			"neg": NegArgument,
-			"add": AddArgument,
-			"sub": SubArgument,
-			"mul": MulArgument,
-			"div": DivArgument,
-			"mod": ModArgument,
-			"lt": LtArgument,
-			"le": LeArgument,
-			"ge": GeArgument,
-			"gt": GtArgument,
-			"eq": EqArgument,
-			"ne": NeArgument,
-			"not": NotArgument,
-			"and": AndArgument,
-			"or": OrAgument,
-			"set": SetArgument,
-			"seq": SeqArgument,
-			"print": PrintArgument,
-			"readi": ReadiArgument,
-			"reads": ReadsArgument,
-			"if": IfArgument,
-			"while": WhileArgument,
-			"def": DefArgument,
-		}
-		if argument_types.has_key(id_str):
-			return lambda s: argument_types[id_str](s, scope=self.scope)
+		argument_class = OPERATORS.get(id_str)
+		if argument_class:
+			return lambda s: argument_class(s, scope=self.scope)
  
-		if self.scope.get_scope(id_str):
-			return lambda s: FunctionCallArgument(s, scope=self.scope, name=id_str)
+		callee = self.scope.get_scope(id_str)
+		if callee:
+			self.scope.add_callee(callee)
+			return lambda s: FunctionCallArgument(s, scope=self.scope, callee=callee)
 			
 		raise Exception("Identifier '{}' not found.".format(repr(id_str)))
 
 
-	def find_arg(self, expression):
+	def find_arg(self, name):
 		"""
 			Function given by the Argument to the parser, 
-			defining how it procedes, when it finds a special name.
+			defining how it procedes, when it finds a new form.
 
 			Special case:
 				
 				It can be the parameter part of a function definition: "(def function (a) a)""
 	
 				In this case, "a" is a parameter, but the parser sees "a" as a function, call.
-				The compiler notices this case and doesn't process it.
+				The compiler notices this case and collects the names in a ParameterList.
 
 			If it isn't the special case, we try and find the function to call
 
+			@arg name 	name heading the form, None for an empty form
+			@returns 	the parser callbacks of the new form
 		"""
-		clean_expression = re.sub("\t|\n"," ", expression)
 		if isinstance(self, DefArgument) and len(self.all_args) == 1:
-			#arg = ([name] + parameters) if name else []
-			if clean_expression.strip():
-				arg = clean_expression.split(" ")
-			else:
-				arg = []
+			arg = ParameterList([name] if name else [])
 		else:
-			function_call = clean_expression.split(" ",1)
-			name, parameters = function_call if len(function_call) > 1 else (function_call[0], None)
-
-			call_class = self.getArgumentClass(name)
-			arg = call_class(parameters if parameters else None)
+			call_class = self.getArgumentClass(name or "")
+			arg = call_class(None)
 
 		self.all_args.append(arg)
+		return arg.parser_fns()
 
 	def find_var(self, arg):
 		var = VarArgument(arg, self.scope)
@@ -166,7 +287,25 @@ class Argument:
 		self.all_args.append(IntegerArgument(int_arg))
 
 	def find_str(self, string):
-		self.all_args.append(StringArgument(string))
+		self.all_args.append(StringArgument(string, scope=self.scope))
+
+class ParameterList(list):
+	"""
+		Parameter names of a function definition: "(a b)" in "(def function (a b) a)"
+	"""
+	__slots__ = ()
+
+	def parser_fns(self):
+		def not_a_name(arg):
+			raise Exception("Function parameter '{}' is not a name".format(arg))
+
+		return {
+			"string" : not_a_name,
+			"integer" : not_a_name,
+			"variable": self.append,
+			"argument" : not_a_name,
+		}
+
 
 class AddArgument(Argument):
 	def execute(self):
@@ -196,29 +335,40 @@ class SubArgument(Argument):
 		return ctypes.INT
 
 class VarArgument(Argument):
+	__slots__ = ("arg", "slot")
+
 	def __init__(self, s, scope):
 		self.scope = scope
 		self.arg = s
-		self.callable = False
+		self.slot = None
+
+	def resolve(self):
+		# the address of the variable is (self.scope, self.slot), see scope.SymbolTable
+		self.slot = self.scope.slot(self.arg)
 
 	def compile(self):
-		return  self.scope.compile(self.arg)
+		return  self.scope.compile(self.slot)
 
 	def set(self, val):
 		self.scope[self.arg] = val 
 
 	def type(self):
-		return self.scope.get_variable(self.arg).ctype
+		return self.scope.variable(self.slot).ctype
 
 
 class IntegerArgument(Argument):
+	__slots__ = ("val",)
+
 	def __init__(self, s, *args, **kwargs):
-		self.callable = False
 		self.val = int(s)
 
 	def execute(self):
 		return self.val
 
+	def infer(self):
+		# constants have no scope, their type is the same in every function
+		return self.type()
+
 	def compile(self):
 		return str(self.val)
 
@@ -226,45 +376,65 @@ class IntegerArgument(Argument):
 		return ctypes.INT
 
 class StringArgument(Argument):
-	def __init__(self, s, *args, **kwargs):
-		self.callable = False
+	__slots__ = ("string",)
+
+	def __init__(self, s, scope=None):
 		#Argument.__init__(self,s) -> doesnt perform parsing
 		self.string = s
+		self.scope = scope # where the literal is interned, see Scope.literal
 
 	def execute(self):
 		return self.string
 
+	def infer(self):
+		return self.type()
+
 	def compile(self):
-		return "\"{}\"".format(self.string)
+		return self.scope.literal(self.string)
 
 	def type(self):
 		return ctypes.STRING
 
 class SeqArgument(Argument):
-	def __init__(self,*args, **kwargs):
-		Argument.__init__(self, *args, **kwargs)
-		self.callable = True
+	callable = True
 
 	def execute(self):
 		args = [arg.execute() for arg in self.all_args]
 		return args[-1]
 
 	def compile(self, call=False):
-		def mapfn(arg):
-			return (arg.compile(call=True) if arg.callable else arg.compile()) + ";"
+		statements = [self.compile_form(arg) for arg in self.all_args]
+
+		# a GNU statement expression, its value is the last statement's
+		if call and self.scope.options.get("inline"):
+			return "({{ {}; }})".format("; ".join(statements))
 
-		seq_calls = map(mapfn, self.all_args)
+		seq_calls = [statement + ";" for statement in statements]
 
-		if  self.all_args[-1].type() != ctypes.VOID:
+		if  self.all_args[-1].infer() != ctypes.VOID:
 			seq_calls[-1] = "return {}".format(seq_calls[-1])
 
-		fn_call = self.scope.helper('\n'.join(seq_calls), type=self.type())
+		fn_call = self.scope.helper('\n'.join(seq_calls), type=self.infer())
 		return "{}()".format(fn_call) if call else fn_call 
 
+	def compile_block(self):
+		"""
+			@returns 	the C statements of the sequence, when its value isn't needed
+		"""
+		return "; ".join(self.compile_form(arg) for arg in self.all_args)
+
+	def tail_calls(self, function):
+		return self.all_args[-1].tail_calls(function)
+
+	def compile_tail(self, function):
+		if not self.tail_calls(function):
+			return Argument.compile_tail(self, function)
+		statements = [self.compile_form(arg) + ";" for arg in self.all_args[:-1]]
+		return " ".join(statements + [self.all_args[-1].compile_tail(function)])
+
 
 	def type(self):
-		map(lambda arg: arg.type(), self.all_args[:-1])
-		return self.all_args[-1].type()
+		return self.all_args[-1].infer()
 
 
 class WhileArgument(Argument):
@@ -279,11 +449,12 @@ class WhileArgument(Argument):
 	def compile(self):
 		whiles ="""while ({}) {{{};}}"""
 		
-		check = self.all_args[0].compile(call=True)\
-				if self.all_args[0].callable else self.all_args[0].compile()
-		body = self.all_args[1].compile(call=True)\
-				if self.all_args[1].callable else self.all_args[1].compile()
-		return whiles.format(check, body)
+		check = self.compile_form(self.all_args[0])
+		body = self.all_args[1]
+
+		if isinstance(body, SeqArgument) and self.scope.options.get("inline"):
+			return whiles.format(check, body.compile_block())
+		return whiles.format(check, self.compile_form(body))
 
 	def type(self):
 		return ctypes.INT
@@ -295,8 +466,14 @@ class EqArgument(Argument):
 	def type(self):
 		return ctypes.INT
 	def compile(self):
-		eq = "({})".format(self.all_args[0].compile())
-		for arg in self.all_args[1:]:
+		first, args = self.all_args[0], self.all_args[1:]
+		if first.infer() == ctypes.STRING:
+			# lengths first, see lisp_def.c
+			eq = "__str_eq({}, {})".format(first.compile(), args[0].compile())
+			args = args[1:]
+		else:
+			eq = "({})".format(first.compile())
+		for arg in args:
 			eq = "({} == {})".format(eq, arg.compile())
 		return eq
 
@@ -306,8 +483,13 @@ class NeArgument(Argument):
 	def type(self):
 		return ctypes.INT
 	def compile(self):
-		ne = "({})".format(self.all_args[0].compile())
-		for arg in self.all_args[1:]:
+		first, args = self.all_args[0], self.all_args[1:]
+		if first.infer() == ctypes.STRING:
+			ne = "!__str_eq({}, {})".format(first.compile(), args[0].compile())
+			args = args[1:]
+		else:
+			ne = "({})".format(first.compile())
+		for arg in args:
 			ne = "({} != {})".format(ne, arg.compile())
 		return ne
 
@@ -328,26 +510,24 @@ class SetArgument(Argument):
 		self.all_args[0].set(self.all_args[1].execute())
 	
 	def compile(self):
-		if not self.scope.in_compilation_scope:
-			raise Exception("No scope being compiled, can't set the scope")
-		return self.scope.in_compilation_scope.new_variable(self.all_args[0].compile(),
-										self.all_args[1].type(),
-										self.all_args[1].compile()) # is this callable??
+		return self.scope.new_variable(self.all_args[0].slot,
+										self.all_args[1].infer(),
+										self.compile_form(self.all_args[1]))
+
+	def infer(self):
+		# declares the variable, before its name is typed
+		if self not in self.scope.annotations():
+			self.scope.new_variable(self.all_args[0].slot, self.all_args[1].infer(), None)
+		return Argument.infer(self)
 
 	def type(self):
-		if not self.scope.in_compilation_scope:
-			raise Exception("No scope being compiled, can't set the scope")
-		self.scope.in_compilation_scope.new_variable(self.all_args[0].compile(),
-										self.all_args[1].type(),
-										None)
-		return self.all_args[1].type()
+		return self.all_args[1].infer()
 		#return ctypes.VOID
 
 
 class PrintArgument(Argument):
-	def __init__(self, *args, **kwargs):
-		Argument.__init__(self, *args, **kwargs);
-		self.callable = True
+	callable = True
+
 	def compile(self, call=False):
 
 		type_formatters = []
@@ -355,14 +535,18 @@ class PrintArgument(Argument):
 		print_args = [arg.compile() for arg in self.all_args]
 
 		for arg in self.all_args:
-			if arg.type() == ctypes.STRING:
+			if arg.infer() == ctypes.STRING:
 				type_formatters.append("%s")
 			else:
 				type_formatters.append("%d")
 
-		prints = "printf(\"{}\\n\",{});".format(" ".join(type_formatters),\
+		printf = "printf(\"{}\\n\",{})".format(" ".join(type_formatters),\
 		  ", ".join(print_args))
 
+		if call and self.scope.options.get("inline"):
+			return printf
+		prints = printf + ";"
+
 		fn_call = self.scope.helper(prints)
 		return "{}()".format(fn_call) if call else fn_call 
 
@@ -375,17 +559,37 @@ class IfArgument(Argument):
 			return self.all_args[1].execute()
 		return self.all_args[2].execute()
 
-	def compile(self):
-
-		if self.all_args[0].type() != ctypes.INT:
+	def check(self):
+		"""
+			@returns 	the type of the if, once its condition and branches are checked
+		"""
+		if self.all_args[0].infer() != ctypes.INT:
 			raise Exception("Condition must return true value");
 
-		if_type = self.all_args[1].type()
+		if_type = self.infer()
+		branches = set(arg.infer() for arg in self.all_args[1:]) - set([ctypes.NONE])
 
-		if if_type != self.all_args[2].type():
+		if len(branches) > 1:
 			raise Exception("If branches must have same return value")
+		return if_type
 
-		
+	def compile(self):
+		if_type = self.check()
+
+		if self.scope.options.get("if_runtime"):
+			return self.compile_runtime(if_type)
+
+		# only the branch taken is evaluated
+		condition, then, otherwise = [self.compile_form(arg) for arg in self.all_args]
+		if if_type == ctypes.VOID:
+			return "(({}) ? (void)({}) : (void)({}))".format(condition, then, otherwise)
+		return "(({}) ? ({}) : ({}))".format(condition, then, otherwise)
+
+	def compile_runtime(self, if_type):
+		"""
+			Compiles to the __if_* functions of lisp_def.c, both branches are evaluated
+			before the call (void branches are given as function pointers)
+		"""
 		fn_arg_str = "({},{},{})".format(*[arg.compile() for arg in self.all_args])
 
 		if if_type == ctypes.VOID: 
@@ -402,8 +606,23 @@ class IfArgument(Argument):
 		return if_type_fn_str
 
 
+	def tail_calls(self, function):
+		# the __if_* functions evaluate both branches, there is no tail position
+		return (not self.scope.options.get("if_runtime") 
+				and any(arg.tail_calls(function) for arg in self.all_args[1:]))
+
+	def compile_tail(self, function):
+		if not self.tail_calls(function):
+			return Argument.compile_tail(self, function)
+		self.check()
+		condition = self.compile_form(self.all_args[0])
+		then, otherwise = [arg.compile_tail(function) for arg in self.all_args[1:]]
+		return "if ({}) {{{}}} else {{{}}}".format(condition, then, otherwise)
+
 	def type(self):
-		return ctypes.INT
+		# a recursive call has no type yet (see ScopeFunction.infer)
+		then = self.all_args[1].infer()
+		return then if then != ctypes.NONE else self.all_args[2].infer()
 
 
 class NotArgument(Argument):
@@ -540,15 +759,146 @@ class ReadsArgument(Argument):
 		return ctypes.STRING
 
 	def compile(self):
-		#same problem as above
-		return "()"
+		return "__reads()"
 
 
-class DefArgument(Argument):
-	def __init__(self, *args, **kwargs):
+def vector_argument(arg, builtin):
+	"""
+		Checks the argument of a vector builtin is a vector 
+		(or has no type yet, a recursive call, see ScopeFunction.infer)
+	"""
+	if arg.infer() not in (ctypes.VECTOR, ctypes.NONE):
+		raise Exception("'{}' expects a vector, received {}".format(builtin, arg.infer()))
+	return Argument.compile_form(arg)
+
+
+class VecArgument(Argument):
+	"""
+		(vec n value) : vector of n elements, all equal to value (0 if not given)
+	"""
+	def compile(self):
+		value = self.compile_form(self.all_args[1]) if len(self.all_args) > 1 else "0"
+		return "__vec_fill({}, {})".format(self.compile_form(self.all_args[0]), value)
+
+	def type(self):
+		return ctypes.VECTOR
 
+class VrefArgument(Argument):
+	"""
+		(vref v i) : the element i of the vector
+	"""
+	def compile(self):
+		return "({})[{}]".format(vector_argument(self.all_args[0], "vref"),
+								self.compile_form(self.all_args[1]))
+
+	def type(self):
+		return ctypes.INT
+
+class VsetArgument(Argument):
+	"""
+		(vset v i value) : sets the element i of the vector, its value is the value set
+	"""
+	def compile(self):
+		return "(({})[{}] = {})".format(vector_argument(self.all_args[0], "vset"),
+										self.compile_form(self.all_args[1]),
+										self.compile_form(self.all_args[2]))
+
+	def type(self):
+		return ctypes.INT
+
+class VlenArgument(Argument):
+	def compile(self):
+		return "__vec_len({})".format(vector_argument(self.all_args[0], "vlen"))
+
+	def type(self):
+		return ctypes.INT
+
+class VsumArgument(Argument):
+	def compile(self):
+		return "__vec_sum({})".format(vector_argument(self.all_args[0], "vsum"))
+
+	def type(self):
+		return ctypes.INT
+
+
+class LoopArgument(Argument):
+	"""
+		Builtin applying a definition to the elements of a vector, the definition is named
+		by the first argument: "(vmap f v)". It compiles to a helper with a for loop
+		over restrict pointers, calling the definition's function for int parameters.
+	"""
+	__slots__ = ("callee",)
+
+	# number of parameters of the definition
+	parameters = 1
+
+	def __init__(self, *args, **kwargs):
+		self.callee = None # scope of the definition
 		Argument.__init__(self, *args, **kwargs)
 
+	def find_var(self, arg):
+		if self.callee is None and not self.all_args:
+			self.callee = self.scope.get_scope(arg)
+			if not self.callee:
+				raise Exception("Identifier '{}' not found.".format(repr(arg)))
+			self.scope.add_callee(self.callee)
+		else:
+			Argument.find_var(self, arg)
+
+	def function(self):
+		"""
+			@returns 	the ScopeFunction of the definition for int parameters, see Scope.specialize
+		"""
+		if self.callee is None:
+			raise Exception("'{}' expects the name of a definition".format(self.builtin))
+		function = self.callee.specialize([ctypes.INT] * self.parameters, self.scope)
+		if function.infer() != ctypes.INT:
+			raise Exception("'{}' expects a definition returning int, '{}' returns {}"
+				.format(self.builtin, self.callee.name, function.ret))
+		return function
+
+class VmapArgument(LoopArgument):
+	"""
+		(vmap f v) : new vector with (f x) for each element x of v
+	"""
+	builtin = "vmap"
+
+	def compile(self):
+		loop = ("const int *restrict in = {vector}; int len = __vec_len(in), i; "
+				"int *restrict out = __vec_new(len); "
+				"for (i = 0; i < len; i++) out[i] = {function}(in[i]); "
+				"return out")
+		return "{}()".format(self.scope.helper(loop.format(
+			vector=vector_argument(self.all_args[0], self.builtin), 
+			function=self.function().name), type=ctypes.VECTOR))
+
+	def type(self):
+		self.function()
+		return ctypes.VECTOR
+
+class VfoldArgument(LoopArgument):
+	"""
+		(vfold f init v) : (f (f init x0) x1)... for the elements of v
+	"""
+	builtin = "vfold"
+	parameters = 2
+
+	def compile(self):
+		loop = ("const int *restrict in = {vector}; int len = __vec_len(in), i, acc = {init}; "
+				"for (i = 0; i < len; i++) acc = {function}(acc, in[i]); "
+				"return acc")
+		return "{}()".format(self.scope.helper(loop.format(
+			vector=vector_argument(self.all_args[1], self.builtin), 
+			init=self.compile_form(self.all_args[0]),
+			function=self.function().name), type=ctypes.INT))
+
+	def type(self):
+		self.function()
+		return ctypes.INT
+
+
+class DefArgument(Argument):
+	def close(self):
 		for var in self.all_args[1]:
 			self.scope.new_parameter(var)#VarArgument(var, scope=self.scope).compile())
 
@@ -559,27 +909,75 @@ class DefArgument(Argument):
 	def compile(self):
 		return ""
 
+	def resolve(self):
+		# the parameters have the first slots (see close), the name belongs to the parent scope
+		self.all_args[2].resolve()
+
+	def infer(self):
+		# the body is typed for each variant, see ScopeFunction.infer
+		return self.type()
+
 	def type(self):
-		return self.all_args[2].type()
+		return ctypes.VOID
+
+	def dependencies(self):
+		"""
+			@returns 	scopes of the other definitions this one calls (FunctionCallArgument)
+		"""
+		return self.scope.dependencies()
+
+	def restore(self, state, text):
+		"""
+			Reuses the code generated for this definition by the previous compilation, 
+			if neither its text nor the definitions it calls have changed since then.
+
+			@arg state 	wp.incremental.BuildState
+			@arg text 	source of this definition
+			@returns 	digest of the source
+		"""
+		digest = state.digest(text)
+		fragment = state.get(self.scope.name, digest)
+
+		if fragment and all(scope.restored for scope in self.dependencies()):
+			self.scope.restore(fragment)
+		return digest
 
 
 class FunctionCallArgument(Argument):
+	__slots__ = ("callee",)
+
 	def __init__(self, *args, **kwargs):
 		#quick hack
-		self.fn_name = kwargs.pop("name")
+		self.callee = kwargs.pop("callee") # scope of the function called
 
 		Argument.__init__(self, *args, **kwargs)
 
 	def compile(self):
-		fn_name = self.scope.get_scope(self.fn_name).call(self.all_args)
-		return template.functionCall(fn_name, [arg.compile() for arg in self.all_args])
+		function = self.callee.call(self.all_args, self.scope)
+		if function is self.scope.function:
+			function.reentered = True
+		return template.functionCall(function.name, [arg.compile() for arg in self.all_args])
 
 	def type(self):
-		scope = self.scope.get_scope(self.fn_name)
-		#scope.call(self.all_args)
-		return scope.type()
+		return self.callee.call(self.all_args, self.scope).infer()
+
+	def tail_calls(self, function):
+		return self.callee is function.scope and self.callee.lookup(self.all_args) is function
+
+	def compile_tail(self, function):
+		if not self.tail_calls(function):
+			return Argument.compile_tail(self, function)
+		self.callee.call(self.all_args, self.scope)
+
+		# the arguments read the parameters from the scope's struct, 
+		# so the C parameters can be assigned one after the other
+		assignments = ["{} = {};".format(var.name, arg.compile()) 
+						for var, arg in zip(function.variables.get_params(), self.all_args)]
+		return " ".join(assignments + ["goto {};".format(function.label)])
 
 class CFunctionCallArgument(Argument):
+	__slots__ = ("fn_name",)
+
 	def __init__(self, *args, **kwargs):
 		self.fn_name = kwargs.pop("name")
 		Argument.__init__(self, *args, **kwargs)
@@ -592,3 +990,38 @@ class CFunctionCallArgument(Argument):
 
 	def type(self):
 		return creturns[self.fn_name]
+
+
+# argument class of each operator
+OPERATORS = {
+	"neg": NegArgument,
+	"add": AddArgument,
+	"sub": SubArgument,
+	"mul": MulArgument,
+	"div": DivArgument,
+	"mod": ModArgument,
+	"lt": LtArgument,
+	"le": LeArgument,
+	"ge": GeArgument,
+	"gt": GtArgument,
+	"eq": EqArgument,
+	"ne": NeArgument,
+	"not": NotArgument,
+	"and": AndArgument,
+	"or": OrAgument,
+	"set": SetArgument,
+	"seq": SeqArgument,
+	"print": PrintArgument,
+	"readi": ReadiArgument,
+	"reads": ReadsArgument,
+	"if": IfArgument,
+	"while": WhileArgument,
+	"def": DefArgument,
+	"vec": VecArgument,
+	"vref": VrefArgument,
+	"vset": VsetArgument,
+	"vlen": VlenArgument,
+	"vsum": VsumArgument,
+	"vmap": VmapArgument,
+	"vfold": VfoldArgument,
+}
@@ -0,0 +1,166 @@
+"""
+	Closure interpreter (interpreter.Interpreter) against a naive tree-walking evaluator,
+	on the programs of test/test.wp and on an expression over variables
+
+	usage: python -m bench.closures [n]
+"""
+import os
+import sys
+import time
+
+from argument import Argument
+from interpreter import Interpreter, _div, _mod
+from scope import Scope
+
+
+EXPRESSION = ("(def f (a b c)"
+			  " (if (or (eq (mod (add a (mul b c)) 3) 0) (lt (sub 100 (mul 7 b)) 20))"
+			  " (add (mul 2 (add b (mul c 5))) (div 100 (add b c)) (neg a))"
+			  " (mul (add a 2) (sub 10 c))))")
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+						"test", "test.wp")) as f:
+	EXAMPLES = f.read()
+
+PROGRAMS = [
+	("sum_up_to_n", "(sum_up_to_n {n})"),
+	("sum_up_to_n_2", "(sum_up_to_n_2 {n})"),
+	("multiplication_table", "(seq (set i 0) (while (lt i {tables}) (seq (multiplication_table) (set i (add i 1)))))"),
+]
+
+
+class Walker:
+	"""
+		Naive tree-walking evaluator, the baseline: each evaluation dispatches on the
+		class of the node, the arguments are evaluated into a list (like Argument.execute)
+		and the variables are looked up by name in a dict for each call
+	"""
+	def __init__(self, out):
+		self.out = out
+
+	def run(self, program):
+		env = {}
+		value = 0
+		for arg in program.all_args:
+			value = self.evaluate(arg, env)
+		return value
+
+	def evaluate(self, node, env):
+		return getattr(self, type(node).__name__)(node, env)
+
+	def values(self, node, env):
+		return [self.evaluate(arg, env) for arg in node.all_args]
+
+	def IntegerArgument(self, node, env):
+		return node.val
+
+	def StringArgument(self, node, env):
+		return node.string
+
+	def VarArgument(self, node, env):
+		return env.get(node.arg, 0)
+
+	def AddArgument(self, node, env):
+		return sum(self.values(node, env))
+
+	def SubArgument(self, node, env):
+		return reduce(lambda a, b: a - b, self.values(node, env))
+
+	def MulArgument(self, node, env):
+		return reduce(lambda a, b: a * b, self.values(node, env), 1)
+
+	def DivArgument(self, node, env):
+		return _div(*self.values(node, env))
+
+	def ModArgument(self, node, env):
+		return _mod(*self.values(node, env))
+
+	def NegArgument(self, node, env):
+		return -self.values(node, env)[0]
+
+	def LtArgument(self, node, env):
+		a, b = self.values(node, env)
+		return int(a < b)
+
+	def LeArgument(self, node, env):
+		a, b = self.values(node, env)
+		return int(a <= b)
+
+	def EqArgument(self, node, env):
+		a, b = self.values(node, env)
+		return int(a == b)
+
+	def OrAgument(self, node, env):
+		a, b = self.values(node, env)
+		return int(bool(a or b))
+
+	def IfArgument(self, node, env):
+		condition, then, otherwise = node.all_args
+		return self.evaluate(then if self.evaluate(condition, env) else otherwise, env)
+
+	def SetArgument(self, node, env):
+		env[node.all_args[0].arg] = value = self.evaluate(node.all_args[1], env)
+		return value
+
+	def SeqArgument(self, node, env):
+		return self.values(node, env)[-1]
+
+	def WhileArgument(self, node, env):
+		condition, body = node.all_args
+		while self.evaluate(condition, env):
+			self.evaluate(body, env)
+		return 0
+
+	def PrintArgument(self, node, env):
+		self.out.write(" ".join(str(value) for value in self.values(node, env)) + "\n")
+		return 0
+
+	def DefArgument(self, node, env):
+		return 0
+
+	def FunctionCallArgument(self, node, env):
+		scope = node.callee
+		names = [scope.table.name(scope, slot) for slot in scope.variables.parameters]
+		return self.evaluate(scope.body, dict(zip(names, self.values(node, env))))
+
+
+class Null:
+	def write(self, text):
+		pass
+
+
+def timed(fn, repeat=1):
+	start = time.time()
+	for _ in range(repeat):
+		fn()
+	return time.time() - start
+
+def report(name, walking, closures):
+	print "{}".format(name)
+	print "  tree walking: {:.3f}s".format(walking)
+	print "  closures:     {:.3f}s ({:.1f}x)".format(closures, walking / closures)
+
+
+if __name__ == '__main__':
+	n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+	definition = Argument(EXPRESSION, scope=Scope())
+	definition.resolve()
+	expression = definition.all_args[0].all_args[2]
+	closure = Interpreter().closure(expression)
+	walker = Walker(Null())
+	env = {"a": 17, "b": 3, "c": 4}
+	frame = [17, 3, 4]
+	assert walker.evaluate(expression, env) == closure(frame)
+	repeat = n / 5
+	report("expression over variables x{}".format(repeat),
+		timed(lambda: walker.evaluate(expression, env), repeat),
+		timed(lambda: closure(frame), repeat))
+
+	for name, call in PROGRAMS:
+		source = EXAMPLES + call.format(n=n, tables=max(1, n / 1000))
+		assert (Walker(Null()).run(Argument(source, scope=Scope())) 
+				== Interpreter(out=Null()).run(Argument(source, scope=Scope())))
+		walking = timed(lambda: Walker(Null()).run(Argument(source, scope=Scope())))
+		closures = timed(lambda: Interpreter(out=Null()).run(Argument(source, scope=Scope())))
+		report("{} (n={})".format(name, n), walking, closures)
@@ -0,0 +1,138 @@
+"""
+	Compile time of the programs of bench.generator, by phase: parsing (Parser.parse),
+	type inference (with the resolution pass) and code generation (compile and emission),
+	with the peak memory of the process. 
+
+	Each case runs in its own process, the results are printed as JSON,
+	a case that can't be compiled has an "error" instead of its measures.
+
+	usage: python -m bench.compiler [repeat] [output.json]
+	       python -m bench.compiler --case '{"defs": 100}' [repeat]
+"""
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+
+from argument import Argument
+from scope import Scope, HelperTable
+from wp.emitter import Emitter
+from bench.generator import program
+
+
+BASE = {"defs": 50, "depth": 3, "fanout": 4, "signatures": 1, "workload": "int"}
+
+# values of each axis, the others keep their BASE value
+AXES = [
+	("defs", [10, 200, 1000]),
+	("depth", [1, 6, 12]),
+	("fanout", [1, 16, 64]),
+	("signatures", [2, 4]),
+	("workload", ["string"]),
+]
+
+
+class Null:
+	"""
+		Output counting the bytes written
+	"""
+	def __init__(self):
+		self.size = 0
+
+	def write(self, text):
+		self.size += len(text)
+
+
+def cases():
+	yield dict(BASE)
+	for axis, values in AXES:
+		for value in values:
+			case = dict(BASE)
+			case[axis] = value
+			yield case
+
+
+def phases(source):
+	"""
+		@returns 	seconds spent by each phase and bytes of C generated
+	"""
+	start = time.time()
+	tree = Argument(source, scope=Scope())
+	parsed = time.time()
+
+	for arg in tree.all_args:
+		arg.resolve()
+		arg.infer()
+	inferred = time.time()
+
+	emitter = Emitter(HelperTable())
+	calls = [Argument.compile_form(arg) for arg in tree.all_args]
+	tree.scope.emit(emitter)
+	for call in calls:
+		emitter.call(call)
+	out = Null()
+	emitter.write(out)
+	compiled = time.time()
+
+	return {
+		"parse": parsed - start,
+		"infer": inferred - parsed,
+		"compile": compiled - inferred,
+	}, out.size
+
+
+def measure(case, repeat):
+	"""
+		Runs in the process of the case
+
+		@returns 	the fastest time of each phase, the size of the program and the peak memory
+	"""
+	source = program(**case)
+	try:
+		runs = [phases(source) for _ in range(repeat)]
+	except Exception as e:
+		return {"case": case, "error": "{}: {}".format(type(e).__name__, e)}
+
+	result = {"case": case, "source_bytes": len(source), "c_bytes": runs[0][1]}
+	for phase in ("parse", "infer", "compile"):
+		result[phase] = min(times[phase] for times, _ in runs)
+	# kilobytes on linux
+	result["peak_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return result
+
+
+def run(case, repeat):
+	root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	output = subprocess.check_output([sys.executable, "-m", "bench.compiler", 
+										"--case", json.dumps(case), str(repeat)], cwd=root)
+	return json.loads(output)
+
+
+if __name__ == '__main__':
+	if len(sys.argv) > 2 and sys.argv[1] == "--case":
+		repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+		print json.dumps(measure(json.loads(sys.argv[2]), repeat))
+		sys.exit(0)
+
+	repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+	results = {
+		"python": platform.python_version(),
+		"machine": platform.machine(),
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"repeat": repeat,
+		"results": [],
+	}
+	for case in cases():
+		results["results"].append(run(case, repeat))
+		sys.stderr.write(".")
+	sys.stderr.write("\n")
+
+	report = json.dumps(results, indent=2, sort_keys=True)
+	if len(sys.argv) > 2:
+		with open(sys.argv[2], "w") as f:
+			f.write(report + "\n")
+	else:
+		print report
@@ -0,0 +1,73 @@
+"""
+	Synthetic whisper programs for the benchmarks, generated along several axes.
+
+	usage: python -m bench.generator [defs] [depth] [fanout] [signatures] [int|string]
+"""
+import sys
+
+
+def expression(depth, leaf="x"):
+	"""
+		@returns 	nested arithmetic on leaf, depth operations deep
+	"""
+	if not depth:
+		return leaf
+	return "(add {} (mul {} 2))".format(leaf, expression(depth - 1, leaf))
+
+
+def block(depth, workload):
+	"""
+		@returns 	a void form with depth levels of nested seq and if
+	"""
+	if not depth:
+		if workload == "string":
+			return "(print \"x is\" x \"at the bottom\")"
+		return "(print x)"
+	return "(seq (set x (add x 1)) (if (lt x 1000) {} (print x)))".format(block(depth - 1, workload))
+
+
+def parameters(signatures):
+	"""
+		@returns 	number of parameters needed for the signatures (each can be int or string)
+	"""
+	count = 1
+	while 2 ** count < signatures:
+		count += 1
+	return count
+
+
+def arguments(signature, count, call):
+	"""
+		@returns 	the arguments of a call, the bits of signature choose the string ones
+	"""
+	return " ".join("\"s{}\"".format(call) if signature >> i & 1 else str(call)
+					for i in range(count))
+
+
+def program(defs=50, depth=3, fanout=4, signatures=1, workload="int"):
+	"""
+		@arg defs 		number of top-level definitions
+		@arg depth 		nesting depth of the expressions and blocks of each definition
+		@arg fanout 	number of calls to each definition
+		@arg signatures number of distinct argument types each definition is called with
+		@arg workload 	"int" or "string", strings add string literals to the prints
+		@returns 	source of the program
+	"""
+	count = parameters(signatures)
+	names = " ".join("p{}".format(i) for i in range(count))
+
+	source = []
+	for i in range(defs):
+		source.append("(def f{} ({})\n\t(seq\n\t\t(print {})\n\t\t(set x {})\n\t\t{}\n\t\tx))"
+			.format(i, names, names, expression(depth, str(i)), block(depth, workload)))
+		for call in range(fanout):
+			source.append("(f{} {})".format(i, arguments(call % signatures, count, call)))
+	return "\n".join(source) + "\n"
+
+
+if __name__ == '__main__':
+	args = sys.argv[1:]
+	axes = [int(arg) for arg in args[:4]]
+	if len(args) > 4:
+		axes.append(args[4])
+	sys.stdout.write(program(*axes))
@@ -0,0 +1,78 @@
+"""
+	Memory used by the Argument tree of a large program, against the same tree
+	made of nodes without __slots__ (each node's attributes in a __dict__).
+
+	usage: python -m bench.memory [forms]
+"""
+import sys
+
+from argument import Argument
+
+
+FORM = "(print (add 1 (mul x 2)) \"text\" (seq (set y (neg 3)) y))\n"
+
+
+def node_size(node):
+	"""
+		Bytes held by a single node: the instance, its __dict__ (if any)
+		and its list of arguments
+	"""
+	size = sys.getsizeof(node)
+	if hasattr(node, "__dict__"):
+		size += sys.getsizeof(node.__dict__)
+	all_args = getattr(node, "all_args", None)
+	if isinstance(all_args, list):
+		size += sys.getsizeof(all_args)
+	return size
+
+
+# node class: the same class without __slots__
+_unslotted = {}
+
+def slot_names(cls):
+	return [name for klass in cls.__mro__ for name in getattr(klass, "__slots__", ())]
+
+def unslotted(node):
+	"""
+		Copy of the node as an instance of a class without __slots__, 
+		with the same attributes in its __dict__
+	"""
+	cls = _unslotted.get(type(node))
+	if cls is None:
+		cls = _unslotted[type(node)] = type(type(node).__name__, (object,), {})
+	copy = cls()
+	for name in slot_names(type(node)):
+		if hasattr(node, name):
+			setattr(copy, name, getattr(node, name))
+	return copy
+
+
+def measure(forms):
+	"""
+		@returns 	number of nodes, bytes of the nodes and bytes of the same nodes without __slots__
+	"""
+	program = Argument(FORM * forms)
+
+	nodes = 0
+	size = 0
+	baseline = 0
+	stack = list(program.all_args)
+	while stack:
+		node = stack.pop()
+		nodes += 1
+		size += node_size(node)
+		baseline += node_size(unslotted(node))
+		stack.extend(getattr(node, "all_args", None) or [])
+
+	return nodes, size, baseline
+
+
+if __name__ == '__main__':
+	forms = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+	nodes, size, baseline = measure(forms)
+	print "forms: {}".format(forms)
+	print "nodes: {}".format(nodes)
+	print "{:<16} {:>12} {:>15}".format("", "bytes", "bytes per node")
+	print "{:<16} {:>12} {:>15.1f}".format("__slots__", size, float(size) / nodes)
+	print "{:<16} {:>12} {:>15.1f}".format("__dict__", baseline, float(baseline) / nodes)
+	print "saved: {} bytes ({:.0%})".format(baseline - size, 1 - float(size) / baseline)
@@ -0,0 +1,52 @@
+"""
+	Scaling of the parallel code generation (whisper.py -j N) with the number of processes.
+
+	usage: python -m bench.parallel [max_jobs] [definitions]
+"""
+import sys
+import time
+import multiprocessing
+
+from argument import Argument
+from scope import Scope
+from wp import template
+
+
+def expression(depth):
+	if not depth:
+		return "a"
+	return "(add a (mul {} (sub a {})))".format(expression(depth - 1), depth)
+
+
+def program(definitions, statements=40, depth=12):
+	"""
+		definitions that don't call each other, each called once from main
+	"""
+	body = "(seq {})".format(" ".join("(print {})".format(expression(depth))
+										for _ in range(statements)))
+	source = []
+	for i in range(definitions):
+		source.append("(def f{} (a) {})".format(i, body))
+		source.append("(f{} {})".format(i, i))
+	return "\n".join(source)
+
+
+def measure(source, jobs):
+	start = time.time()
+	code = template.program(Argument(source, scope=Scope()).compile_sections(jobs=jobs))
+	return time.time() - start, code
+
+
+if __name__ == '__main__':
+	max_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+	definitions = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+	source = program(definitions)
+	serial, expected = measure(source, 1)
+	print "definitions: {}".format(definitions)
+	print "jobs  seconds  speedup  identical"
+	print "{:>4}  {:>7.3f}  {:>7.2f}  {}".format(1, serial, 1.0, True)
+
+	for jobs in range(2, max_jobs + 1):
+		seconds, code = measure(source, jobs)
+		print "{:>4}  {:>7.3f}  {:>7.2f}  {}".format(jobs, seconds, serial / seconds, code == expected)
@@ -0,0 +1,298 @@
+"""
+	Run time of the C generated for a corpus of programs (the loop examples of test/test.wp,
+	repeated REPEAT times), built with cc at several optimization levels and code generation 
+	options, against the same programs written by hand in C and the python interpreter 
+	(interpreter.Interpreter, Argument.execute() can't run definitions).
+
+	The interpreter runs the programs repeated REPEAT/PYTHON_SCALE times, 
+	its time is extrapolated. Every build must print the same as the hand-written program.
+
+	usage: python -m bench.runtime [-r REPEAT] [-O LEVEL ...] [--json FILE] [program.wp ...]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from collections import OrderedDict
+
+from argument import Argument
+from interpreter import Interpreter
+from scope import Scope
+from wp import template
+
+
+CC = os.environ.get("CC", "cc")
+
+PYTHON_SCALE = 100
+
+# code generation options compared (see Scope)
+BUILDS = OrderedDict([
+	("default", {}),
+	("inline", {"inline": True}),
+	("if-runtime", {"if_runtime": True}),
+])
+
+SUM_UP_TO_N = ("""
+(def sum_up_to_n (n)
+	(seq
+		(set current 1)
+		(set result 0)
+		(while (le current n)
+			(seq
+				(set result (add current result))
+				(set current (add current 1))))
+		result))
+
+(set k 0)
+(set total 0)
+(while (lt k REPEAT)
+	(seq
+		(set total (mod (add total (sum_up_to_n 10000)) 1000003))
+		(set k (add k 1))))
+(print total)
+""", """
+#include <stdio.h>
+
+int sum_up_to_n(int n) {
+	int current = 1, result = 0;
+	while (current <= n) {
+		result += current;
+		current++;
+	}
+	return result;
+}
+
+int main() {
+	int k, total = 0;
+	for (k = 0; k < REPEAT; k++)
+		total = (total + sum_up_to_n(10000)) % 1000003;
+	printf("%d\\n", total);
+	return 0;
+}
+""")
+
+SUM_UP_TO_N_2 = ("""
+(def sum_up_to_n_2 (n)
+	(seq
+		(set current 1)
+		(set result 0)
+		(while (le current n)
+			(seq
+				(set result
+					(if (or (eq (mod current 3) 0) (eq (mod current 5) 0))
+						(add result current)
+						result))
+				(set current (add current 1))))
+		result))
+
+(set k 0)
+(set total 0)
+(while (lt k REPEAT)
+	(seq
+		(set total (mod (add total (sum_up_to_n_2 10000)) 1000003))
+		(set k (add k 1))))
+(print total)
+""", """
+#include <stdio.h>
+
+int sum_up_to_n_2(int n) {
+	int current = 1, result = 0;
+	while (current <= n) {
+		if (current % 3 == 0 || current % 5 == 0)
+			result += current;
+		current++;
+	}
+	return result;
+}
+
+int main() {
+	int k, total = 0;
+	for (k = 0; k < REPEAT; k++)
+		total = (total + sum_up_to_n_2(10000)) % 1000003;
+	printf("%d\\n", total);
+	return 0;
+}
+""")
+
+MULTIPLICATION_TABLE = ("""
+(def multiplication_table ()
+	(seq
+		(set i 0)
+		(set current 0)
+		(while (le i 12)
+			(seq
+				(while (le current 10)
+					(seq
+						(print current "x" i ": " (mul current i))
+						(set current (add current 1))))
+				(set current 0)
+				(set i (add i 1))))
+		0))
+
+(set k 0)
+(while (lt k REPEAT)
+	(seq
+		(multiplication_table)
+		(set k (add k 1))))
+""", """
+#include <stdio.h>
+
+void multiplication_table() {
+	int i, current;
+	for (i = 0; i <= 12; i++)
+		for (current = 0; current <= 10; current++)
+			printf("%d %s %d %s %d\\n", current, "x", i, ": ", current * i);
+}
+
+int main() {
+	int k;
+	for (k = 0; k < REPEAT; k++)
+		multiplication_table();
+	return 0;
+}
+""")
+
+CORPUS = OrderedDict([
+	("sum_up_to_n", SUM_UP_TO_N),
+	("sum_up_to_n_2", SUM_UP_TO_N_2),
+	("multiplication_table", MULTIPLICATION_TABLE),
+])
+
+
+class Discard:
+	def write(self, text):
+		pass
+
+
+def transpile(source, options):
+	return template.program(Argument(source, scope=Scope(options=options)).compile_sections())
+
+
+def build(code, directory, name, level):
+	"""
+		Builds C code with cc, against the runtime (test/output/lisp_def.c)
+
+		@returns 	path of the executable
+	"""
+	c_file = os.path.join(directory, name + ".c")
+	with open(c_file, "w") as f:
+		f.write(code)
+	binary = os.path.join(directory, name)
+	runtime = os.path.dirname(template.RUNTIME)
+	subprocess.check_call([CC, level, "-w", "-I", runtime, "-o", binary, c_file])
+	return binary
+
+
+def run(binary, repeat=3):
+	"""
+		@returns 	fastest wall time of the executable and its output
+	"""
+	best = None
+	with tempfile.TemporaryFile() as out:
+		for _ in range(repeat):
+			out.seek(0)
+			out.truncate()
+			start = time.time()
+			subprocess.check_call([binary], stdout=out)
+			elapsed = time.time() - start
+			best = elapsed if best is None else min(best, elapsed)
+		out.seek(0)
+		return best, out.read()
+
+
+def interpret(source):
+	start = time.time()
+	Interpreter(out=Discard()).run(Argument(source, scope=Scope()))
+	return time.time() - start
+
+
+def measure(name, source, hand_written, levels, directory, python=True, repeat=None):
+	"""
+		@arg source 	program, with REPEAT replaced by the number of repetitions if given
+		@arg hand_written 	the same program in C, or None
+		@returns 	list of results of the program, the hand-written one first
+	"""
+	def repeated(code, times=repeat):
+		return code.replace("REPEAT", str(times)) if repeat is not None else code
+
+	results = []
+	expected = None
+	baseline = {}
+
+	for level in levels:
+		if hand_written:
+			seconds, expected = run(build(repeated(hand_written), directory, name + "_c", level))
+			baseline[level] = seconds
+			results.append({"program": name, "build": "hand-written", "level": level,
+							"seconds": seconds, "relative": 1.0})
+
+		for build_name, options in BUILDS.items():
+			binary = build(transpile(repeated(source), options), directory, name, level)
+			seconds, output = run(binary)
+			if expected is not None and output != expected:
+				raise Exception("{} ({} {}) printed something else than the hand-written program"
+								.format(name, build_name, level))
+			results.append({"program": name, "build": build_name, "level": level,
+							"seconds": seconds, "relative": seconds / baseline[level] 
+															if level in baseline else None})
+
+	if python:
+		if repeat is not None:
+			scaled = max(1, repeat // PYTHON_SCALE)
+			seconds = interpret(repeated(source, scaled)) * repeat / scaled
+		else:
+			seconds = interpret(source)
+		results.append({"program": name, "build": "interpreter", "level": None, "seconds": seconds,
+						"relative": seconds / baseline[levels[0]] if baseline else None})
+	return results
+
+
+def report(results, out):
+	out.write("{:<22} {:<14} {:<5} {:>9} {:>10}\n".format("program", "build", "cc", "seconds", 
+																"x hand C"))
+	for result in results:
+		relative = result["relative"]
+		out.write("{:<22} {:<14} {:<5} {:>9.4f} {:>10}\n".format(result["program"], result["build"], 
+			result["level"] or "", result["seconds"], 
+			"{:.2f}".format(relative) if relative is not None else "-"))
+
+
+if __name__ == '__main__':
+	import argparse
+
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+	parser.add_argument("programs", nargs="*", metavar="program.wp",
+		help="programs run instead of the corpus, as they are (no hand-written version)")
+	parser.add_argument("-r", "--repeat", type=int, default=300,
+		help="repetitions of the corpus programs (default: 300)")
+	parser.add_argument("-O", dest="levels", action="append", metavar="LEVEL",
+		help="cc optimization level, can be repeated (default: 0 and 2)")
+	parser.add_argument("--no-python", dest="python", action="store_false",
+		help="don't run the interpreter")
+	parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+	options = parser.parse_args()
+
+	levels = ["-O" + level for level in (options.levels or ["0", "2"])]
+	directory = tempfile.mkdtemp()
+	results = []
+	try:
+		if options.programs:
+			for path in options.programs:
+				with open(path) as f:
+					source = f.read()
+				name = os.path.splitext(os.path.basename(path))[0]
+				results += measure(name, source, None, levels, directory, options.python)
+		else:
+			for name, (source, hand_written) in CORPUS.items():
+				results += measure(name, source, hand_written, levels, directory, options.python,
+									options.repeat)
+	finally:
+		shutil.rmtree(directory)
+
+	report(results, sys.stdout)
+	if options.json:
+		with open(options.json, "w") as f:
+			json.dump(results, f, indent=2)
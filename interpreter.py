@@ -0,0 +1,375 @@
+import sys
+import operator
+
+from argument import (IntegerArgument, StringArgument, VarArgument, AddArgument, SubArgument,
+	MulArgument, DivArgument, ModArgument, NegArgument, LtArgument, LeArgument, GeArgument,
+	GtArgument, EqArgument, NeArgument, NotArgument, AndArgument, OrAgument, SetArgument,
+	SeqArgument, PrintArgument, ReadiArgument, ReadsArgument, IfArgument, WhileArgument,
+	DefArgument, FunctionCallArgument, VecArgument, VrefArgument, VsetArgument, VlenArgument,
+	VsumArgument, VmapArgument, VfoldArgument)
+
+
+def _div(a, b):
+	# C division, truncates towards zero
+	quotient = abs(a) // abs(b)
+	return quotient if (a < 0) == (b < 0) else -quotient
+
+def _mod(a, b):
+	return a - b * _div(a, b)
+
+def _compare(operation):
+	# the comparisons of C give 0 or 1
+	return lambda a, b: 1 if operation(a, b) else 0
+
+
+class Function(object):
+	"""
+		A def (or the main program) compiled to a closure over a frame,
+		the frame is a list with a slot for each of the scope's variables (see Scope.slot)
+	"""
+	__slots__ = ("name", "size", "body")
+
+	def __init__(self, name, size):
+		self.name = name
+		self.size = size
+		self.body = None
+
+	def __call__(self, *args):
+		frame = list(args)
+		if len(frame) < self.size:
+			frame.extend([0] * (self.size - len(frame)))
+		return self.body(frame)
+
+
+class Interpreter:
+	"""
+		Runs programs without generating C, the Argument tree is converted once
+		into nested python closures taking the frame of the running function,
+		variables are resolved to frame slots and function calls to their Function.
+
+		The closures are specialised when they are built: operations on constants
+		are computed once, and the operands that are constants or variables are read
+		by the closure of the operation instead of being called. An operation on a
+		variable and a variable or constant is applied by set and while themselves.
+
+		Arithmetic follows the generated C (integer division truncates),
+		print writes its arguments separated by spaces, like the generated printf.
+	"""
+
+	def __init__(self, out=sys.stdout, read=raw_input):
+		self.out = out
+		self.read = read
+		self.functions = {} # Scope: Function
+		self.constants = {} # closure: value, closures that always give the same value
+		self.slots = {} # closure: index, closures reading a variable of the frame
+		self.operands = {} # closure: (operation, index, index or None, constant), see operation
+
+		self.compilers = {
+			IntegerArgument: self.integer,
+			StringArgument: self.string,
+			VarArgument: self.variable,
+			AddArgument: self.add,
+			SubArgument: self.sub,
+			MulArgument: self.mul,
+			DivArgument: self.binary(_div),
+			ModArgument: self.binary(_mod),
+			NegArgument: self.neg,
+			LtArgument: self.binary(_compare(operator.lt)),
+			LeArgument: self.binary(_compare(operator.le)),
+			GeArgument: self.binary(_compare(operator.ge)),
+			GtArgument: self.binary(_compare(operator.gt)),
+			EqArgument: self.equality(_compare(operator.eq)),
+			NeArgument: self.equality(_compare(operator.ne)),
+			NotArgument: self.not_,
+			AndArgument: self.and_,
+			OrAgument: self.or_,
+			SetArgument: self.set,
+			SeqArgument: self.seq,
+			PrintArgument: self.print_,
+			ReadiArgument: self.readi,
+			ReadsArgument: self.reads,
+			IfArgument: self.if_,
+			WhileArgument: self.while_,
+			DefArgument: self.define,
+			FunctionCallArgument: self.call,
+			VecArgument: self.vec,
+			VrefArgument: self.vref,
+			VsetArgument: self.vset,
+			VlenArgument: self.vlen,
+			VsumArgument: self.vsum,
+			VmapArgument: self.vmap,
+			VfoldArgument: self.vfold,
+		}
+
+	def run(self, program):
+		"""
+			@arg program 	Argument with the top-level forms
+			@returns 	the value of the last form
+		"""
+		return self.compile(program)()
+
+	def compile(self, program):
+		"""
+			@returns 	Function running the top-level forms of the program
+		"""
+		program.resolve()
+		main = self.function(program.scope)
+		forms = [self.closure(arg) for arg in program.all_args]
+
+		def body(frame):
+			value = 0
+			for form in forms:
+				value = form(frame)
+			return value
+
+		main.body = body
+		return main
+
+	def function(self, scope):
+		"""
+			@returns 	the Function of a scope, its body is compiled on first use
+		"""
+		function = self.functions.get(scope)
+		if not function:
+			function = self.functions[scope] = Function(scope.name, scope.table.size(scope))
+			if scope.father:
+				function.body = self.closure(scope.body)
+		return function
+
+	def closure(self, node):
+		compiler = self.compilers.get(type(node))
+		if not compiler:
+			raise Exception("Can't run '{}'".format(type(node).__name__))
+		return compiler(node)
+
+	def closures(self, node):
+		return [self.closure(arg) for arg in node.all_args]
+
+	def constant(self, value):
+		closure = lambda frame: value
+		self.constants[closure] = value
+		return closure
+
+	def operation(self, operation, a, b):
+		"""
+			@arg operation 	function of two values
+			@returns 	closure applying the operation to the values of closures a and b,
+						or a constant if both are (and the operation doesn't fail)
+		"""
+		constants, slots = self.constants, self.slots
+
+		if a in constants and b in constants:
+			try:
+				return self.constant(operation(constants[a], constants[b]))
+			except ZeroDivisionError:
+				# raised when the program runs, if it gets there
+				pass
+
+		if a in slots:
+			i = slots[a]
+			if b in slots:
+				j = slots[b]
+				closure = lambda frame: operation(frame[i], frame[j])
+				self.operands[closure] = (operation, i, j, None)
+				return closure
+			if b in constants:
+				c = constants[b]
+				closure = lambda frame: operation(frame[i], c)
+				self.operands[closure] = (operation, i, None, c)
+				return closure
+			return lambda frame: operation(frame[i], b(frame))
+
+		if a in constants:
+			c = constants[a]
+			if b in slots:
+				j = slots[b]
+				return lambda frame: operation(c, frame[j])
+			return lambda frame: operation(c, b(frame))
+
+		if b in slots:
+			j = slots[b]
+			return lambda frame: operation(a(frame), frame[j])
+		if b in constants:
+			c = constants[b]
+			return lambda frame: operation(a(frame), c)
+		return lambda frame: operation(a(frame), b(frame))
+
+	def operations(self, operation, args, empty=0):
+		"""
+			@returns 	closure applying the operation from left to right, ((a op b) op c) ...
+						or giving empty without arguments
+		"""
+		if not args:
+			return self.constant(empty)
+		closure = args[0]
+		for arg in args[1:]:
+			closure = self.operation(operation, closure, arg)
+		return closure
+
+	def integer(self, node):
+		return self.constant(node.val)
+
+	def string(self, node):
+		return self.constant(node.string)
+
+	def variable(self, node):
+		index = node.slot
+		closure = lambda frame: frame[index]
+		self.slots[closure] = index
+		return closure
+
+	def add(self, node):
+		return self.operations(operator.add, self.closures(node))
+
+	def sub(self, node):
+		return self.operations(operator.sub, self.closures(node))
+
+	def mul(self, node):
+		return self.operations(operator.mul, self.closures(node), 1)
+
+	def binary(self, operation):
+		def compiler(node):
+			return self.operation(operation, *self.closures(node)[:2])
+		return compiler
+
+	def neg(self, node):
+		return self.operation(operator.sub, self.constant(0), self.closure(node.all_args[0]))
+
+	def equality(self, operation):
+		# (eq a b c) is ((a == b) == c) in C
+		def compiler(node):
+			return self.operations(operation, self.closures(node))
+		return compiler
+
+	def not_(self, node):
+		return self.operation(_compare(operator.eq), self.closure(node.all_args[0]), self.constant(0))
+
+	def and_(self, node):
+		a, b = self.closures(node)[:2]
+		return lambda frame: 1 if a(frame) and b(frame) else 0
+
+	def or_(self, node):
+		a, b = self.closures(node)[:2]
+		return lambda frame: 1 if a(frame) or b(frame) else 0
+
+	def set(self, node):
+		var, value = node.all_args[0], self.closure(node.all_args[1])
+		index = var.slot
+
+		if value in self.operands:
+			operation, i, j, c = self.operands[value]
+			if j is None:
+				def set_(frame):
+					frame[index] = result = operation(frame[i], c)
+					return result
+			else:
+				def set_(frame):
+					frame[index] = result = operation(frame[i], frame[j])
+					return result
+			return set_
+
+		def set_(frame):
+			frame[index] = result = value(frame)
+			return result
+		return set_
+
+	def seq(self, node):
+		args = self.closures(node)
+		body, last = args[:-1], args[-1]
+
+		def seq_(frame):
+			for arg in body:
+				arg(frame)
+			return last(frame)
+		return seq_
+
+	def print_(self, node):
+		args = self.closures(node)
+		write = self.out.write
+
+		def print_(frame):
+			write(" ".join(str(arg(frame)) for arg in args) + "\n")
+			return 0
+		return print_
+
+	def readi(self, node):
+		read = self.read
+		return lambda frame: int(read())
+
+	def reads(self, node):
+		read = self.read
+		return lambda frame: read()
+
+	def if_(self, node):
+		condition, then, otherwise = self.closures(node)
+		if condition in self.constants:
+			return then if self.constants[condition] else otherwise
+		return lambda frame: then(frame) if condition(frame) else otherwise(frame)
+
+	def while_(self, node):
+		condition, body = self.closures(node)
+
+		if condition in self.operands:
+			operation, i, j, c = self.operands[condition]
+			if j is None:
+				def while_(frame):
+					while operation(frame[i], c):
+						body(frame)
+					return 0
+			else:
+				def while_(frame):
+					while operation(frame[i], frame[j]):
+						body(frame)
+					return 0
+			return while_
+
+		def while_(frame):
+			while condition(frame):
+				body(frame)
+			return 0
+		return while_
+
+	def define(self, node):
+		self.function(node.scope)
+		return lambda frame: 0
+
+	def call(self, node):
+		function = self.function(node.callee)
+		args = self.closures(node)
+		return lambda frame: function(*[arg(frame) for arg in args])
+
+	def vec(self, node):
+		args = self.closures(node)
+		size, value = args[0], args[1] if len(args) > 1 else self.integer(IntegerArgument(0))
+		return lambda frame: [value(frame)] * size(frame)
+
+	def vref(self, node):
+		vector, index = self.closures(node)[:2]
+		return lambda frame: vector(frame)[index(frame)]
+
+	def vset(self, node):
+		vector, index, value = self.closures(node)[:3]
+
+		def vset_(frame):
+			elements = vector(frame)
+			elements[index(frame)] = result = value(frame)
+			return result
+		return vset_
+
+	def vlen(self, node):
+		vector = self.closure(node.all_args[0])
+		return lambda frame: len(vector(frame))
+
+	def vsum(self, node):
+		vector = self.closure(node.all_args[0])
+		return lambda frame: sum(vector(frame))
+
+	def vmap(self, node):
+		function = self.function(node.callee)
+		vector = self.closure(node.all_args[0])
+		return lambda frame: [function(element) for element in vector(frame)]
+
+	def vfold(self, node):
+		function = self.function(node.callee)
+		init, vector = self.closures(node)[:2]
+		return lambda frame: reduce(function, vector(frame), init(frame))
@@ -0,0 +1,118 @@
+from argument import (Argument, IntegerArgument, AddArgument, SubArgument, MulArgument,
+	DivArgument, ModArgument, NegArgument, LtArgument, LeArgument, GeArgument, GtArgument,
+	EqArgument, NeArgument, NotArgument, AndArgument, OrAgument, DefArgument)
+
+
+# operations folded when all their arguments are constant, with their number of arguments
+# (None for any), their value is given by execute()
+FOLDABLE = {
+	AddArgument: None,
+	SubArgument: None,
+	MulArgument: None,
+	DivArgument: 2,
+	ModArgument: 2,
+	NegArgument: 1,
+	LtArgument: 2,
+	LeArgument: 2,
+	GeArgument: 2,
+	GtArgument: 2,
+	EqArgument: 2,
+	NeArgument: 2,
+	NotArgument: 1,
+	AndArgument: 2,
+	OrAgument: 2,
+}
+
+# operations whose value is always 0 or 1
+BOOLEAN = (LtArgument, LeArgument, GeArgument, GtArgument, EqArgument, NeArgument,
+			NotArgument, AndArgument, OrAgument)
+
+
+def constant(node, value=None):
+	return isinstance(node, IntegerArgument) and (value is None or node.val == value)
+
+
+class ConstantFolder:
+	"""
+		Optimization pass run between parsing and compile(),
+		replaces operations on constants with their value and removes
+		identity operations (x*1, x+0, x-0, x/1, not not x).
+
+		- eliminated : number of nodes removed from the trees folded
+	"""
+
+	def __init__(self):
+		self.eliminated = 0
+
+	def fold(self, node):
+		"""
+			@arg node 	Argument to optimize, its arguments are replaced in place
+			@returns 	the optimized node, the same node or the one replacing it
+		"""
+		if not isinstance(node, Argument) or not hasattr(node, "all_args"):
+			return node
+
+		node.all_args[:] = [self.fold(arg) for arg in node.all_args]
+
+		if isinstance(node, DefArgument):
+			node.scope.new_scope_function(node.all_args[2])
+			return node
+
+		return self.evaluate(node) or self.simplify(node)
+
+	def evaluate(self, node):
+		args = node.all_args
+		count = FOLDABLE.get(type(node), 0)
+		if count == 0 or (count and len(args) != count) or not args:
+			return None
+		if not all(constant(arg) for arg in args):
+			return None
+
+		# C division truncates, python's rounds down, only fold when both agree
+		if isinstance(node, (DivArgument, ModArgument)) and (args[1].val <= 0 or args[0].val < 0):
+			return None
+
+		value = node.execute()
+		# python's and/or give one of their operands, C's give 0 or 1
+		if isinstance(node, BOOLEAN):
+			value = bool(value)
+
+		self.eliminated += len(args)
+		return IntegerArgument(int(value))
+
+	def simplify(self, node):
+		args = node.all_args
+
+		if isinstance(node, (AddArgument, SubArgument, MulArgument)):
+			identity = 1 if isinstance(node, MulArgument) else 0
+			# the first argument of a subtraction isn't an operand of the identity
+			keep = args[:1] if isinstance(node, SubArgument) else []
+			keep += [arg for arg in args[len(keep):] if not constant(arg, identity)]
+			if not keep or len(keep) == len(args):
+				return node
+			if len(keep) == 1 and not keep[0].callable:
+				self.eliminated += len(args)
+				return keep[0]
+			self.eliminated += len(args) - len(keep)
+			node.all_args[:] = keep
+			return node
+
+		if isinstance(node, DivArgument) and len(args) == 2 and constant(args[1], 1):
+			return self.replace(node, args[0])
+
+		if isinstance(node, NotArgument) and isinstance(args[0], NotArgument):
+			inner = args[0].all_args[0]
+			if isinstance(inner, BOOLEAN) or constant(inner, 0) or constant(inner, 1):
+				return self.replace(node, inner)
+
+		return node
+
+	def replace(self, node, arg):
+		"""
+			Replaces node (and its other arguments) with arg, unless arg is callable
+			(it wouldn't compile to a value)
+		"""
+		if arg.callable:
+			return node
+		self.eliminated += 2
+		return arg
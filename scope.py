@@ -1,6 +1,10 @@
 from collections import OrderedDict
+import multiprocessing
+import hashlib
+import re
 
 from wp.types import ctypes
+from wp.emitter import Emitter
 
 
 class ScopeVariable:
@@ -20,6 +24,8 @@ class ScopeVariable:
 	def create(name, ctype=ctypes.NONE, value=None):
 		if ctype == ctypes.STRING:
 			return StringVariable(name, value=value)
+		elif ctype == ctypes.VECTOR:
+			return VectorVariable(name, value=value)
 		elif ctype == ctypes.INT:
 			return PrimitiveVariable(name, ctype=ctype, value=value)
 		else:
@@ -60,30 +66,28 @@ class PrimitiveVariable(ScopeVariable):
 	def clone(self):
 		return PrimitiveVariable(self.name, ctype=self.ctype, value=self.value)
 
-class StringVariable(ScopeVariable):
+class StringVariable(PrimitiveVariable):
+	"""
+		A string is a pointer to the characters of a length-prefixed string of lisp_def.c 
+		(an interned literal, see Scope.literal, or a string allocated from the arena), 
+		assigning it doesn't copy the characters. Initialized to the empty string.
+	"""
 	def __init__(self, name, ctype=None, value=None):
-		self.name = name
-		self._value = value if value else ""
-		self.ctype = ctypes.STRING
-		self.size = len(self._value)
+		PrimitiveVariable.__init__(self, name, ctype=ctypes.STRING, value=value or "__str_empty.data")
 
-	@property
-	def value(self):
-		return _value
-
-	@value.setter
-	def value(self, value):
-		self.size = max(self.size, len(value))
-		self._value = value
-
-	def init(self, scope_name):
-		return "memcpy({}.{}, {}, {});\n".format(scope_name,self.name, self.value, self.size)
+	def clone(self):
+		return StringVariable(self.name, value=self.value)
 
-	def declare(self):
-		return "{} {}[{}];".format("char", var.name, var.size)
+class VectorVariable(PrimitiveVariable):
+	"""
+		A vector is a pointer to the elements of a length-prefixed int array of lisp_def.c,
+		assigning it doesn't copy the elements. Initialized to the empty vector.
+	"""
+	def __init__(self, name, ctype=None, value=None):
+		PrimitiveVariable.__init__(self, name, ctype=ctypes.VECTOR, value=value or "__vec_empty.data")
 
 	def clone(self):
-		return StringVariable(self.name, self.value)
+		return VectorVariable(self.name, value=self.value)
 
 class ObjectVariable(ScopeVariable):
 	pass
@@ -95,42 +99,72 @@ class ScopeVariables:
 	"""
 		Defines a C structure where a scope's variables are stored.
 		A object of this type takes care of declaring scope variables.
+		Variables are stored by their slot in the scope's symbol table (see Scope.slot).
 
 		- add : a variable
-		- get : a variable
+		- get / at : a variable, by name / by slot
 		- init/init_all : C initialization for 1/all variables and parameters
 		- declare/declare_all : C declaration for 1/all variables and parameters
 		- create : C struct declaration for all variables and parameters
+		- clone : a table sharing the variables of this one (copy on write)
+
+		A clone (the variables of a ScopeFunction) only stores the variables added 
+		or replaced in it, the others are read from the table it was cloned from,
+		which isn't changed afterwards (variables are replaced, never modified).
 	"""
-	def __init__(self, scope):
-		self.args = OrderedDict() # (name: Variable())
+	def __init__(self, scope, base=None):
+		self.args = {} # slot: Variable(), the variables added or replaced in this table
+		self.order = [] # slots added to this table (after the base's), in the order they were added
+		self.base = base # table this one was cloned from, or None
 		self.name = scope.name
 		self.scope = scope
 		self.template = "struct {{{}}} {};"
-		self.parameters = []
+		self.parameters = base.parameters if base else [] # slots of the parameters
 
-	def add(self, variable, parameter=False):
+	def add(self, variable, parameter=False, slot=None):
 		"""
 			Add a variable unique to this scope, the type is important for declaring/initializing it
+
+			@arg slot 	(optional) slot of the variable, found by its name if not given
 		"""
-		arg = self.args.get(variable.name)
+		if slot is None:
+			slot = self.scope.slot(variable.name)
+		arg = self.at(slot)
 
 		## checks if arg reassignment is correct (doesnt check if is one is array and the other is primitive - even if both have the same size)
 		if arg and arg.ctype != ctypes.NONE and arg.ctype != variable.ctype:
 			raise Exception("Variable with name '{}' already exists in this scope, expected {} received {}."
 				.format(arg.name, arg.ctype, variable.ctype))
-		
-		self.args[variable.name] = variable
+
+		if not arg:
+			self.order.append(slot)
+		self.args[slot] = variable
 
 		if parameter:
-			self.parameters.append(variable.name)
+			# the list may be shared with clones
+			self.parameters = self.parameters + [slot]
 
 	def get(self, var_name):
 		"""
 			@returns 	ScopeVariable object or None
 		"""
-		return self.args.get(var_name)
-		
+		slot = self.scope.table.find(self.scope, var_name)
+		return self.at(slot) if slot is not None else None
+
+	def at(self, slot):
+		"""
+			@returns 	ScopeVariable object in the slot or None
+		"""
+		var = self.args.get(slot)
+		if var is None and self.base:
+			return self.base.at(slot)
+		return var
+
+	def slots(self):
+		"""
+			@returns 	slots of the variables, in the order they were added
+		"""
+		return self.base.slots() + self.order if self.base else self.order
 
 	def init(self, var_name):
 		"""
@@ -145,27 +179,25 @@ class ScopeVariables:
 
 			@returns 	string for value assignements
 		"""
-		if not self.args.has_key(var_name):
+		var = self.get(var_name)
+		if not var:
 			raise Exception("Variable '{}' not in scope '{}'".format(var_name, self.name))
 
-		var = self.args[var_name]
-
-		return var.init(self.scope.name)
+		return var.init(self.name)
 
  
 	def declare(self, var_name):
-		if not self.args.has_key(var_name):
+		var = self.get(var_name)
+		if not var:
 			raise Exception("Variable '{}' not in scope '{}'".format(var_name, self.name))
-
-		var = self.args[var_name]
 		
 		return var.declare()
 
 	def init_all(self):
-		return '\n'.join(self.init(var) for var in self.args.keys())
+		return '\n'.join(self.at(slot).init(self.name) for slot in self.slots())
 
 	def declare_all(self):
-		return '\n'.join((self.declare(var) for var in self.args.keys()))
+		return '\n'.join(self.at(slot).declare() for slot in self.slots())
 
 	def create(self):
 		"""
@@ -174,15 +206,14 @@ class ScopeVariables:
 		return self.template.format(self.declare_all(), "__" + self.name)
 
 	def clone(self):
-		## NOTE/TODO: the scope will have a repeated name, need to change it (how? find out)
-		cloned = ScopeVariables(self.scope) # TODO: Do i need the scope? don't i just need a name
-		cloned.parameters = list(self.parameters)
-		for var in self.args.itervalues():
-			cloned.add(var.clone()) 
-		return cloned
+		"""
+			@returns 	a table sharing the variables of this one, in constant time
+		"""
+		self.scope.clones += 1
+		return ScopeVariables(self.scope, base=self)
 
 	def get_params(self):
-		return map(lambda p: self.args[p], self.parameters)
+		return map(self.at, self.parameters)
 
 
 class ScopeFunction:
@@ -191,6 +222,15 @@ class ScopeFunction:
 		- ...
 	"""
 
+	# label at the start of the function, the target of its tail calls (see Argument.compile_tail)
+	label = "__tail"
+
+	# a recursive function saves the struct of its variables while it runs, see create
+	frame_template = ("{ret} {name} ({params}) {{char __frame[sizeof {struct}];\n"
+					  "memcpy(__frame, &{struct}, sizeof {struct});\n"
+					  "{result}{body}({args});\n"
+					  "memcpy(&{struct}, __frame, sizeof {struct});{exit}}}")
+
 	def __init__(self, scope, variables):
 		self.variables = variables
 
@@ -199,10 +239,18 @@ class ScopeFunction:
 		#self.ret = None
 		self.body = scope.body
 		self.ret = None
+		self.types = {} # node: ctype, see Argument.infer
+		self.calls = [] # [scope, types] of the functions called from this one, see Scope.save
+		self.reentered = False # calls itself other than in tail position, see recursive
 		# add myself to the scope
 		self.this_counter = scope.call_counter
 		self.scope.call_counter += 1
 
+		# the first function of a definition has its name, the others are numbered
+		if self.this_counter:
+			self.name = "{}_{}".format(scope.name, self.this_counter)
+		variables.name = self.name
+
 	def name(self):
 		return "{}_{}".format(self.name, self.this_counter)
 
@@ -210,52 +258,264 @@ class ScopeFunction:
 		return self.variables.get(var_name)
 	
 	def create(self):
-		compilation = self.body.compile(call=True) if self.body.callable else self.body.compile()
-		self.ret = self.body.type()
+		self.infer()
+		self.scope.function = self
 
 		fn_template = "{} {} ({}) {{{};}}"
 
 		args = ["{} {}".format(var.ctype, var.name) for var in self.variables.get_params()]
-		fnbody = "{}\n{} {}".format(self.variables.init_all(),\
-			"return" if self.ret != ctypes.VOID else "",\
-			compilation)
 
-		self.scope.protos.append("{} {} ({});".format(self.ret, self.name,','.join(args)))
-		
-		return fn_template.format(self.ret, self.name, ','.join(args), fnbody)
+		if self.body.tail_calls(self):
+			# the calls to itself in tail position assign the parameters and jump back here
+			fnbody = "{}:\n{}\n{}".format(self.label, self.variables.init_all(),
+											self.body.compile_tail(self))
+		else:
+			compilation = self.body.compile(call=True) if self.body.callable else self.body.compile()
+			fnbody = "{}\n{} {}".format(self.variables.init_all(),\
+				"return" if self.ret != ctypes.VOID else "",\
+				compilation)
+
+		if not self.recursive():
+			self.scope.own("protos", list).append("{} {} ({});".format(self.ret, self.name,','.join(args)))
+			return fn_template.format(self.ret, self.name, ','.join(args), fnbody)
+
+		# the variables are in a single struct, a call made while the function runs 
+		# would overwrite them: the function called saves the struct and restores it
+		body = "__body_" + self.name
+		self.scope.own("protos", list).append("{} {} ({});".format(self.ret, self.name,','.join(args)))
+		self.scope.own("protos", list).append("{} {} ({});".format(self.ret, body,','.join(args)))
+		void = self.ret == ctypes.VOID
+		frame = self.frame_template.format(ret=self.ret, name=self.name, params=','.join(args),
+					struct="__" + self.name, body=body,
+					args=','.join(var.name for var in self.variables.get_params()),
+					result="" if void else "{} __result = ".format(self.ret),
+					exit="" if void else "\nreturn __result;")
+		return "\n".join([frame, fn_template.format(self.ret, body, ','.join(args), fnbody)])
+
+	def callees(self):
+		"""
+			@returns 	the functions called from this one (see Scope.specialize)
+		"""
+		functions = [scope.variants.get(scope.signature(types)) for scope, types in self.calls]
+		return [function for function in functions if function is not None]
 
-	def type(self, body):
-		#self.scope.function = self
-		if self.ret:
-			return self.ret
-		 
-		self.ret = body.type()
-		return self.ret 
+	def recursive(self):
+		"""
+			Tail calls to the function itself jump back to its start, 
+			they don't need the variables of the call that made them.
 
-class Scope:
+			@returns 	whether the function can be called again before it returns, 
+						by itself other than in tail position or through other functions
+		"""
+		if self.reentered:
+			return True
+		functions = [function for function in self.callees() if function is not self]
+		visited = set()
+		while functions:
+			function = functions.pop()
+			if function is self:
+				return True
+			if function not in visited:
+				visited.add(function)
+				functions.extend(function.callees())
+		return False
+
+	def infer(self):
+		"""
+			Types the body in the context of this function, the first time it's called.
+			While the body is being typed, recursive calls have the type ctypes.NONE
+
+			@returns 	the return type
+		"""
+		if self.ret is None:
+			function, self.scope.function = self.scope.function, self
+			self.ret = ctypes.NONE
+			self.ret = self.body.infer()
+			self.scope.function = function
 
-	def __init__(self, name="main", scope=None):
+			if self.ret == ctypes.NONE:
+				raise Exception("Can't infer the return type of '{}'".format(self.name))
+		return self.ret
 
+# scope whose children are being compiled by a pool of forked processes
+_forked_scope = None
+
+def _compile_component(names):
+	"""
+		Runs in a worker process, compiles the given children of _forked_scope
+		in the same order as a serial build would
+
+		@returns 	list with the fragment of each child, its functions (see Scope.variant) 
+					and the indexes of the restored functions it used (see Scope.check_fragment)
+	"""
+	scopes = [_forked_scope.scopes[name] for name in names]
+	for scope in scopes:
+		scope.fragment = scope.compile_fragment()
+	return [(scope.fragment, map(scope.variant, scope.functions),
+			[scope.functions.index(function) for function in scope.used])
+			for scope in scopes]
+
+
+class StaleFragment(Exception):
+	"""
+		Raised when the code reused for a scope (see Scope.restore) no longer matches 
+		the calls made to it, the scope must be compiled again.
+	"""
+	def __init__(self, name):
+		Exception.__init__(self, name)
 		self.name = name
+
+	def __str__(self):
+		return "Code reused for '{}' is out of date".format(self.name)
+
+
+class HelperTable:
+	"""
+		Helper functions (see Scope.helper) of a whole scope tree by return type and body,
+		a helper with the same code as a previous one isn't defined, 
+		its calls are renamed to the previous one (see HelperTable.rename).
+
+		Helpers are added by the emitter in the order Scope.emit writes them,
+		so fragments compiled by other processes or reused by an incremental build 
+		give the same program as a serial build.
+
+		- removed : number of helpers not defined because they were duplicates
+	"""
+	name_re = re.compile(r"__fn_\w+")
+
+	def __init__(self):
+		self.clear()
+
+	def clear(self):
+		self.names = {} # (type, body): name
+		self.renamed = {} # name: name of the helper defined with the same code
+		self.removed = 0
+
+	def add(self, type, name, body):
+		"""
+			@arg type 	return type of the helper
+			@arg name 	name given by Scope.helper
+			@arg body 	C code of the helper, it may call helpers added before
+			@returns 	the prototype and the definition of the helper,
+						None if it's a duplicate
+		"""
+		body = self.rename(body)
+		defined = self.names.get((type, body))
+		if defined:
+			self.renamed[name] = defined
+			self.removed += 1
+			return None
+
+		self.names[(type, body)] = name
+		return ("{} {}();".format(type, name),
+				Scope.fn_template.format(type=type, name=name, body=body))
+
+	def rename(self, code):
+		"""
+			@returns 	code calling the helpers that were defined instead of the duplicates
+		"""
+		if not self.renamed:
+			return code
+		return self.name_re.sub(lambda match: self.renamed.get(match.group(), match.group()), code)
+
+
+class SymbolTable:
+	"""
+		Symbol table of a whole program, shared by all its scopes.
+		A variable's address is its scope and its slot there, the slots of a scope
+		are numbered in the order its variables are found (the parameters first, 
+		see DefArgument.close).
+
+		Names are only looked up when the program is parsed and resolved 
+		(see Argument.resolve), the other phases use the addresses.
+	"""
+	def __init__(self):
+		self.slots = {} # scope: {name: slot}
+		self.names = {} # scope: [name of each slot]
+
+	def slot(self, scope, name):
+		"""
+			@returns 	the slot of the variable in the scope, allocated on first use
+		"""
+		slots = self.slots.setdefault(scope, {})
+		slot = slots.get(name)
+		if slot is None:
+			names = self.names.setdefault(scope, [])
+			slot = slots[name] = len(names)
+			names.append(name)
+		return slot
+
+	def find(self, scope, name):
+		"""
+			@returns 	the slot of the variable in the scope, or None
+		"""
+		return self.slots.get(scope, {}).get(name)
+
+	def name(self, scope, slot):
+		return self.names[scope][slot]
+
+	def size(self, scope):
+		"""
+			@returns 	number of slots of the scope
+		"""
+		return len(self.names.get(scope, ()))
+
+
+class Scope:
+	fn_template = "{type} {name}(){{{body};}}"
+	fn_name_template = "__fn_{scope}_{id}"
+
+	# containers most scopes leave empty, the empty ones of the class are shared
+	# by the scopes until they write to them (see Scope.own)
+	scopes = OrderedDict() # Child Scopes
+	functions = []
+	variants = {} # (ctype of each parameter): ScopeFunction
+	types = {} # node: ctype, for the code outside of functions (see annotations)
+	helpers = [] # [type, name, body]
+	protos = []
+	literals = OrderedDict() # name: text, see Scope.literal
+	callees = OrderedDict() # scopes called from this scope (values are None)
+	fragment = {} # code generated for this scope and its children
+	used = [] # restored functions in the order they are called
+
+	def __init__(self, name="main", scope=None, options=None):
+		"""
+			@arg name 		name of the scope, the function name for a definition
+			@arg scope 		(optional) parent scope
+			@arg options 	(optional) code generation options, shared with the whole scope tree
+							- inline: seq and print compile to C expressions instead of helpers
+							- if_runtime: if compiles to the __if_* functions of lisp_def.c
+		"""
+
+		self.name = name
+		self.options = scope.options if scope else (options or {})
 		if scope:
 			scope.add_scope(self)
 
 		self.father = scope
-		self.scopes = OrderedDict() # Child Scopes
 
 		self.fullname = "{}_{}".format(scope.fullname, name) if scope else name
 
+		self.table = scope.table if scope else SymbolTable() # addresses of the variables, see Scope.slot
 		self.function = None
-		self.functions = []
+		self.variant_hits = 0 # calls given an existing function by Scope.call
+		self.clones = 0 # copies of the variables (ScopeVariables.clone)
 		self.variables = ScopeVariables(self)
 		
 		self.fn_counter = 0
-		self.helpers = []
-		self.protos = []
-		
-		self.fn_name_template = "__fn_{scope}_{id}"
-		self.fn_template = "{type} {name}(){{{body};}}"
+		self.call_counter = 0
+		self.restored = False # fragment reused from a previous compilation
 
+	def own(self, name, container):
+		"""
+			@arg name 		attribute of one of the containers of the class (see Scope.scopes)
+			@arg container 	type of the container
+			@returns 	the scope's own container, created on the first write
+		"""
+		value = self.__dict__.get(name)
+		if value is None:
+			value = self.__dict__[name] = container()
+		return value
 
 	def add_scope(self, scope):
 		"""
@@ -263,7 +523,7 @@ class Scope:
 						this way, from the father you can reach a scope function directly
 			@arg scope 		scope object
 		"""
-		self.scopes[scope.name] = scope
+		self.own("scopes", OrderedDict)[scope.name] = scope
 
 
 	def get_scope(self, name):
@@ -274,6 +534,180 @@ class Scope:
 				return s 
 			scope = scope.father
 
+	def add_callee(self, scope):
+		"""
+			Records a call from this scope to another scope's function
+		"""
+		self.own("callees", OrderedDict)[scope] = None
+
+	def dependencies(self):
+		"""
+			@returns 	scopes called from this scope or its children, 
+						that are not one of its children
+		"""
+		inner = []
+		callees = []
+		scopes = [self]
+		while scopes:
+			scope = scopes.pop()
+			inner.append(scope)
+			callees.extend(s for s in scope.callees if s not in callees)
+			scopes.extend(scope.scopes.values())
+
+		return [scope for scope in callees if scope not in inner]
+
+	def components(self):
+		"""
+			Splits the children of this scope into groups that don't call each other,
+			they can be compiled independently.
+
+			@returns 	list of lists of children names, in the children order
+		"""
+		group = dict((name, name) for name in self.scopes)
+
+		def find(name):
+			while group[name] != name:
+				name = group[name]
+			return name
+
+		for name, scope in self.scopes.iteritems():
+			for callee in scope.dependencies():
+				while callee.father and callee.father is not self:
+					callee = callee.father
+				if callee.father is self:
+					group[find(callee.name)] = find(name)
+
+		components = OrderedDict()
+		for name in self.scopes:
+			components.setdefault(find(name), []).append(name)
+		return components.values()
+
+	def compile_children(self, jobs):
+		"""
+			Compiles the children of this scope in a pool of jobs processes,
+			each worker compiles a group of children that don't call each other 
+			(see Scope.components) and the results are stored as their fragments.
+			The functions created or called by the workers are added to the children,
+			afterwards Scope.emit and Scope.save give the same result as a serial build.
+		"""
+		global _forked_scope
+
+		components = [names for names in self.components()
+						if not all(self.scopes[name].restored for name in names)]
+		if len(components) < 2:
+			return
+
+		_forked_scope = self
+		pool = multiprocessing.Pool(min(jobs, len(components)))
+		try:
+			results = pool.map(_compile_component, components, chunksize=1)
+		finally:
+			pool.close()
+			pool.join()
+			_forked_scope = None
+
+		for names, fragments in zip(components, results):
+			for name, (fragment, variants, used) in zip(names, fragments):
+				scope = self.scopes[name]
+				scope.fragment = fragment
+				scope.add_variants(variants)
+				scope.used = [scope.functions[index] for index in used]
+
+	def save(self):
+		"""
+			@returns 	the code generated for this scope, and the signatures of its functions,
+						in a form Scope.restore can reuse
+		"""
+		fragment = dict(self.fragment)
+		fragment["variants"] = map(self.variant, self.functions)
+		return fragment
+
+	def variant(self, function):
+		"""
+			@returns 	the signature, return type and calls to other definitions 
+						of one of this scope's functions, see Scope.add_variants
+		"""
+		return {
+			"params": [[var.name, var.ctype] for var in function.variables.get_params()],
+			"ret": function.ret,
+			"calls": [[scope.fullname, types] for scope, types in self.outer_calls(function)],
+		}
+
+	def add_variants(self, variants):
+		"""
+			Creates the functions of variants given by Scope.variant, without typing 
+			their body, the functions the scope already has only take their calls
+		"""
+		scopes = dict((scope.fullname, scope) for scope in self.dependencies())
+		for variant in variants:
+			for name, types in variant["calls"]:
+				if name not in scopes:
+					raise StaleFragment(self.name)
+
+		for variant in variants:
+			signature = tuple(ctype for name, ctype in variant["params"])
+			function = self.variants.get(signature)
+			if function is None:
+				variables = self.variables.clone()
+				for (name, ctype), slot in zip(variant["params"], self.variables.parameters):
+					variables.add(ScopeVariable.create(name, ctype=ctype, value=name), slot=slot)
+				function = self.new_call(signature, variables)
+				function.ret = variant["ret"]
+			function.calls = [[scopes[name], types] for name, types in variant["calls"]]
+
+	def outer_calls(self, function):
+		"""
+			@returns 	[scope, types] of the calls to other definitions made by the function,
+						directly or through the functions of this scope's children it called,
+						in the order they were first made
+		"""
+		calls = []
+		functions = [function]
+		visited = set()
+		while functions:
+			function = functions.pop()
+			if function in visited:
+				continue
+			visited.add(function)
+			inner = []
+			for scope, types in function.calls:
+				if self.encloses(scope):
+					inner.append(scope.variants[scope.signature(types)])
+				elif [scope, types] not in calls:
+					calls.append([scope, types])
+			functions.extend(reversed(inner))
+		return calls
+
+	def encloses(self, scope):
+		"""
+			@returns 	True if the scope is this one or one of its descendants
+		"""
+		while scope and scope is not self:
+			scope = scope.father
+		return scope is self
+
+	def restore(self, fragment):
+		"""
+			Reuses the code generated by a previous compilation (see Scope.save),
+			the scope's body is neither typed nor compiled again.
+
+			Calls with a signature that isn't in the fragment raise StaleFragment.
+			The first call of a restored function repeats the calls it made to 
+			other definitions, so they are used in the same order as when it was compiled.
+		"""
+		self.add_variants(fragment["variants"])
+		self.fragment = dict((section, fragment[section]) 
+							for section in ("helpers", "protos", "literals", "functions", "variables"))
+		self.restored = True
+
+	def check_fragment(self):
+		"""
+			A restored scope is only up to date if its functions are called 
+			in the same order as when the fragment was saved
+		"""
+		if self.restored and self.used != self.functions:
+			raise StaleFragment(self.name)
+
 
 	def new_scope_function(self, fnArgument):
 		"""
@@ -286,53 +720,76 @@ class Scope:
 
 		self.body = fnArgument
 
-	def compile_protos(self):
-		protos = []
-		for scope in self.scopes.values():
-			protos += scope.compile_protos()
-		return self.protos + protos
-
 	def helper(self, body, type=ctypes.INT):
 		"""
 			new_function - Creates a placeholder function, this function receives no arguments,
+			its code is generated by HelperTable (only once for helpers with the same code)
 			@arg body   body of this function
 			@arg type 	return type for the corresponding C function
 
 			@returns  	the name of the corresponding C function that can be called
 		"""
 		name = self.fn_name_template.format(scope=self.fullname,id=self.fn_counter)
-		self.protos.append("{} {}();".format(type, name))
 		self.fn_counter += 1;
-		template = self.fn_template.format(type=type, name=name,body=body)
-		self.helpers.append(template)
+		self.own("helpers", list).append([type, name, body])
 		return name
 
-	def compile(self, var):
-		return "__{}.{}".format(self.name, var)
-
-	def compile_functions(self):
-		definitions = []
-
-		for functions in self.functions:
-			# NOTE: at scope creation, the list from father to children is shared, but not from scope to other_scopes
-			definitions.append(functions.create())
-
-		for scope in self.scopes.itervalues():
-			definitions.extend(scope.compile_functions())	
-
-		return self.helpers + definitions
+	def literal(self, text):
+		"""
+			Interns a string literal into the constant pool of the program,
+			a static length-prefixed string of lisp_def.c named after its text, 
+			so a literal is defined once whichever scopes use it (see Emitter.literal)
 
+			@returns 	C expression of the string
+		"""
+		name = "__str_" + hashlib.md5(text).hexdigest()[:16]
+		self.own("literals", OrderedDict)[name] = text
+		return name + ".data"
 
-	def compile_variables(self):
-		structs = [self.variables.create()] if self.name == "main" else []
+	def compile(self, slot):
+		"""
+			@returns 	C code of the variable in the slot, for the function being compiled
+		"""
+		return "__{}.{}".format(self.function.name if self.function else self.name, 
+								self.table.name(self, slot))
 
+	def emit(self, emitter):
+		"""
+			Compiles the functions of this scope and its children and writes their code 
+			to the emitter (wp.emitter.Emitter), children after their parent.
+			A scope whose code was generated before writes its fragment instead.
+		"""
+		if self.fragment:
+			emitter.code(self.fragment)
+			return
+
+		# NOTE: at scope creation, the list from father to children is shared, but not from scope to other_scopes
+		definitions = [function.create() for function in self.functions]
+
+		for helper in self.helpers:
+			emitter.helper(*helper)
+		for proto in self.protos:
+			emitter.proto(proto)
+		for name, text in self.literals.items():
+			emitter.literal(name, text)
+		for definition in definitions:
+			emitter.function(definition)
+
+		if self.name == "main":
+			emitter.struct(self.variables.create())
 		for function in self.functions:
-			structs.append(function.variables.create())# scope.compile_variables()
+			emitter.struct(function.variables.create())
 
-		for scope in self.scopes.values():
-			structs.append(scope.compile_variables())
+		for scope in self.scopes.itervalues():
+			scope.emit(emitter)
 
-		return '\n'.join(structs)
+	def compile_fragment(self):
+		"""
+			@returns 	the code of this scope and its children, as it's stored in self.fragment
+		"""
+		emitter = Emitter()
+		self.emit(emitter)
+		return emitter.fragment()
 
 
 	def new_parameter(self, name):
@@ -343,20 +800,26 @@ class Scope:
 		"""
 		self.variables.add(ScopeVariable.create(name), parameter=True)
 
-	def new_variable(self, name, this_type, value):
+	def new_variable(self, slot, this_type, value):
 		"""
-			Creates a new variable for this scope (and children) only
+			Creates a new variable for this scope (and children) only,
+			in the function being compiled if there is one
 
-			@var_name	the name of the variable to be create
+			@slot 		the slot of the variable (see Scope.slot)
 			@var_type 	 the type of the variable  
-			@var 		 the value of the variable
+			@var 		 (optional) C code of the value assigned to the variable
+
+			@returns 	C code of the assignment, if a value is given
 		"""
+		variables = self.function.variables if self.function else self.variables
+		name = self.table.name(self, slot)
+
 		# for redeclarations of values
-		old = self.variables.get(name)
+		old = variables.at(slot)
 		if old:
 			#if variable has no type, create a new one with type
 			if old.ctype == ctypes.NONE:
-				self.variables[name] = ScopeVariable.create(name, ctype=this_type, value=value)
+				variables.add(ScopeVariable.create(name, ctype=this_type), slot=slot)
 
 			# If using a different variable type than declared
 			elif old.ctype != this_type :
@@ -364,54 +827,132 @@ class Scope:
 					.format(this_type, old.ctype))
 
 		else:
-			self.variables.add(ScopeVariable.create(name, ctype=this_type, value=value))
+			variables.add(ScopeVariable.create(name, ctype=this_type), slot=slot)
 
-		return self.init_var(name)
+		if value is not None:
+			return "({} = {})".format(self.compile(slot), value)
 			
 	def get_variable(self, name):
 		return self.function.get(name) if self.function else self.variables.get(name)
 
-	def get_name(self):
-		return self.function.name()
+	def slot(self, name):
+		"""
+			The variables of the scope are numbered in the order they are found 
+			(the parameters first, see DefArgument.close), see SymbolTable
 
+			@returns 	the slot of the variable, allocated on first use
+		"""
+		return self.table.slot(self, name)
 
-	def get_call(self, new_vars):
-		for function in self.functions:
-			for param in new_vars.parameters:
-				if function.get(param).ctype != new_vars.get(param).ctype:
-					break
-			else:
-				return function
-		return None
+	def variable(self, slot):
+		"""
+			@returns 	the variable in the slot, for the function being compiled 
+		"""
+		return (self.function.variables if self.function else self.variables).at(slot)
+
+	def get_name(self):
+		return self.function.name()
 
 
-	def new_call(self, variables):
-		self.function = ScopeFunction(self, variables)
-		self.functions.append(self.function)
+	def new_call(self, signature, variables):
+		function = ScopeFunction(self, variables)
+		self.own("functions", list).append(function)
+		self.own("variants", dict)[signature] = function
+		return function
 
 
-	def call(self, parameters):
+	def call(self, parameters, caller=None):
 		"""
 			Check parameters for this scope's functions
-			- Gives type to all parameters without type
-			- Gets function return type
-			- Creates a scope for these specific parameters/return combo 
+			- Gives type to all parameters without type (their inferred types)
+			- Creates a function for these specific parameters,
+			  its return type is given by ScopeFunction.infer
+
+			The functions are found by the types of the parameters (their signature),
+			the scope's variables are only cloned when a new function is created.
+
+			@returns 	the ScopeFunction called
 		"""	
-		clone = self.variables.clone()
+		return self.specialize(self.parameter_types(parameters), caller)
 
-		for key, argument  in zip(clone.parameters, parameters):
-			arg_type = argument.type()
-			var = ScopeVariable.create(key, ctype=arg_type, value=key) # the value is the variable name (because it is a local parameter)
-			clone.add(var)
+	def specialize(self, types, caller=None):
+		"""
+			@arg types 	ctypes of the first parameters, the others have ctypes.NONE
+			@arg caller 	(optional) scope the call is made from, 
+							the call is recorded in its function (see Scope.save)
+			@returns 	the ScopeFunction for parameters of these types, see Scope.call
+		"""
+		slots = self.variables.parameters
+		signature = self.signature(types)
 
-		function = self.get_call(clone)
+		function = self.variants.get(signature)
 		if function:
-			self.function = function
+			self.variant_hits += 1
+		elif self.restored:
+			raise StaleFragment(self.name)
 		else:
-			self.new_call(clone)
-			
-		return self.function.name
+			clone = self.variables.clone()
+			for slot, arg_type in zip(slots, types):
+				key = self.table.name(self, slot)
+				var = ScopeVariable.create(key, ctype=arg_type, value=key) # the value is the variable name (because it is a local parameter)
+				clone.add(var, slot=slot)
+			function = self.new_call(signature, clone)
+
+		if self.restored and function not in self.used:
+			self.own("used", list).append(function)
+			for scope, scope_types in function.calls:
+				scope.specialize(scope_types)
+
+		if caller is not None and caller.function is not None:
+			call = [self, list(types)]
+			if call not in caller.function.calls:
+				caller.function.calls.append(call)
+
+		return function
+
+	def parameter_types(self, parameters):
+		"""
+			@returns 	the types of the parameters given to this scope's function (Arguments)
+		"""
+		return [argument.infer() for argument in parameters[:len(self.variables.parameters)]]
 
-	def type(self):
-		return self.function.type(self.body)
+	def signature(self, types):
+		"""
+			@returns 	the signature of a function given parameters of these types,
+						ctypes.NONE for the missing ones
+		"""
+		return tuple(list(types) + [ctypes.NONE] * (len(self.variables.parameters) - len(types)))
+
+	def lookup(self, parameters):
+		"""
+			@returns 	the ScopeFunction called with these parameters if it was created 
+						(see Scope.call), or None
+		"""
+		return self.variants.get(self.signature(self.parameter_types(parameters)))
+
+	def statistics(self):
+		"""
+			@returns 	counters of this scope and its children: scopes, functions created,
+						calls that reused a function (see Scope.call), calls to Scope.helper 
+						and copies of the variables
+		"""
+		counters = OrderedDict((name, 0) for name in ("scopes", "variants", "variant_hits",
+														"helpers", "clones"))
+		scopes = [self]
+		while scopes:
+			scope = scopes.pop()
+			counters["scopes"] += 1
+			counters["variants"] += len(scope.functions)
+			counters["variant_hits"] += scope.variant_hits
+			counters["helpers"] += scope.fn_counter
+			counters["clones"] += scope.clones
+			scopes.extend(scope.scopes.values())
+		return counters
+
+	def annotations(self):
+		"""
+			@returns 	the types of this scope's nodes (see Argument.infer), 
+						in the function being typed or compiled
+		"""
+		return self.function.types if self.function else self.own("types", dict)
 
@@ -1,3 +1,5 @@
+#include <stdlib.h>
+#include <stddef.h>
 
 
 #define __if_val(type)\
@@ -53,14 +55,127 @@ int __if_val_fn_void(int cond, int(*__fn1)(), int(*__fn2)())
 
 
 
+/*
+	Strings are length-prefixed: a char* points to the characters of a __str, 
+	its length is stored before them and they end with '\0' (printf can use them).
+	Literals are static (__str_literal, interned by the compiler), the other strings 
+	are allocated from an arena and live until the program ends.
+*/
+typedef struct {
+	int len;
+	char data[];
+} __str;
+
+#define __str_header(s) ((__str *)((s) - offsetof(__str, data)))
+#define __str_len(s) (__str_header(s)->len)
+
+#define __str_literal(name, text)\
+	static struct { int len; char data[sizeof(text)]; } name = {sizeof(text) - 1, text}
+
+#define __ARENA_CHUNK (64 * 1024)
+
+/* bump allocator, its chunks are taken with malloc and never freed */
+static struct {
+	char *next;
+	char *end;
+} __arena;
+
+static void *__arena_alloc(size_t size)
+{
+	void *p;
+	size_t chunk;
+
+	/* the next string's length stays aligned */
+	size = (size + sizeof(int) - 1) & ~(sizeof(int) - 1);
+	if ((size_t)(__arena.end - __arena.next) < size) {
+		chunk = size > __ARENA_CHUNK ? size : __ARENA_CHUNK;
+		__arena.next = malloc(chunk);
+		if (!__arena.next) {
+			fputs("out of memory\n", stderr);
+			exit(1);
+		}
+		__arena.end = __arena.next + chunk;
+	}
+	p = __arena.next;
+	__arena.next += size;
+	return p;
+}
+
+char *__str_new(int len)
+{
+	__str *s = __arena_alloc(offsetof(__str, data) + len + 1);
+	s->len = len;
+	s->data[len] = '\0';
+	return s->data;
+}
+
+char *__str_copy(const char *chars, int len)
+{
+	char *s = __str_new(len);
+	memcpy(s, chars, len);
+	return s;
+}
+
+int __str_eq(char *a, char *b)
+{
+	int len = __str_len(a);
+	return a == b || (len == __str_len(b) && memcmp(a, b, len) == 0);
+}
+
+__str_literal(__str_empty, "");
+
+/*
+	Vectors are length-prefixed like the strings: an int* points to the elements 
+	of a __vec, allocated from the arena (or __vec_empty).
+*/
+typedef struct {
+	int len;
+	int data[];
+} __vec;
+
+#define __vec_header(v) ((__vec *)((char *)(v) - offsetof(__vec, data)))
+#define __vec_len(v) (__vec_header(v)->len)
+
+static struct { int len; int data[1]; } __vec_empty = {0, {0}};
+
+int *__vec_new(int len)
+{
+	__vec *v = __arena_alloc(offsetof(__vec, data) + len * sizeof(int));
+	v->len = len;
+	return v->data;
+}
+
+int *__vec_fill(int len, int value)
+{
+	int *restrict v = __vec_new(len);
+	int i;
+
+	for (i = 0; i < len; i++)
+		v[i] = value;
+	return v;
+}
+
+int __vec_sum(int *v)
+{
+	const int *restrict elements = v;
+	int len = __vec_len(v), sum = 0, i;
+
+	for (i = 0; i < len; i++)
+		sum += elements[i];
+	return sum;
+}
+
 char *__reads()
 {
 	static char buffer[1024];
-	fgets(buffer, 1024, stdin);
-	size_t s = strlen(buffer);
-	if (buffer[s] == '\n')
-		buffer[s] = '\0'; 
-	return buffer;
+	size_t s;
+
+	if (!fgets(buffer, sizeof(buffer), stdin))
+		return __str_empty.data;
+	s = strlen(buffer);
+	if (s && buffer[s - 1] == '\n')
+		buffer[--s] = '\0';
+	return __str_copy(buffer, s);
 }
 
 
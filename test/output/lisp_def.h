@@ -1,3 +1,5 @@
+#include <stdlib.h>
+#include <stddef.h>
 
 
 #define __if_val(type)\
@@ -20,3 +22,41 @@
 		}\
 	}\
 
+
+/*
+	Strings are length-prefixed: a char* points to the characters of a __str, 
+	its length is stored before them and they end with '\0' (printf can use them).
+	Literals are static (__str_literal, interned by the compiler), the other strings 
+	are allocated from an arena and live until the program ends.
+*/
+typedef struct {
+	int len;
+	char data[];
+} __str;
+
+#define __str_header(s) ((__str *)((s) - offsetof(__str, data)))
+#define __str_len(s) (__str_header(s)->len)
+
+#define __str_literal(name, text)\
+	static struct { int len; char data[sizeof(text)]; } name = {sizeof(text) - 1, text}
+
+char *__str_new(int len);
+char *__str_copy(const char *chars, int len);
+int __str_eq(char *a, char *b);
+char *__reads();
+
+/*
+	Vectors are length-prefixed like the strings: an int* points to the elements 
+	of a __vec, allocated from the arena (or __vec_empty).
+*/
+typedef struct {
+	int len;
+	int data[];
+} __vec;
+
+#define __vec_header(v) ((__vec *)((char *)(v) - offsetof(__vec, data)))
+#define __vec_len(v) (__vec_header(v)->len)
+
+int *__vec_new(int len);
+int *__vec_fill(int len, int value);
+int __vec_sum(int *v);
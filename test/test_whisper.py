@@ -0,0 +1,379 @@
+"""
+	Checks of the compiler, run with python -m pytest test/ from the root of the repository
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import tempfile
+import subprocess
+from StringIO import StringIO
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from argument import Argument, VarArgument
+from scope import Scope, SymbolTable, HelperTable
+from wp import fingerprint, template, client
+from wp.cache import CompileCache
+from wp.emitter import Emitter
+from wp.parser import read_forms
+from wp.server import CompileServer
+
+
+@pytest.fixture
+def directory():
+	path = tempfile.mkdtemp()
+	yield path
+	shutil.rmtree(path)
+
+
+def write(directory, name, source):
+	path = os.path.join(directory, name)
+	if not os.path.isdir(os.path.dirname(path)):
+		os.makedirs(os.path.dirname(path))
+	with open(path, "w") as f:
+		f.write(source)
+	return path
+
+
+def whisper(*args, **kwargs):
+	"""
+		Runs whisper.py with the arguments, and the text given as input,
+		its exit status must be the status given (0 by default)
+
+		@returns 	its output and error output
+	"""
+	process = subprocess.Popen([sys.executable, os.path.join(ROOT, "whisper.py")] + list(args),
+					stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	out, err = process.communicate(kwargs.get("input", ""))
+	assert process.returncode == kwargs.get("status", 0), err
+	return out, err
+
+
+def execute(directory, code, input=""):
+	"""
+		Compiles the C code of a program with the runtime of test/output and runs it
+
+		@returns 	its output
+	"""
+	source = write(directory, "program.c", code)
+	binary = os.path.join(directory, "program")
+	subprocess.check_call(["gcc", "-w", "-I", os.path.join(ROOT, "test", "output"), 
+							"-o", binary, source])
+	process = subprocess.Popen([binary], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+	return process.communicate(input)[0]
+
+
+def test_cache_depends_on_compiler(directory, monkeypatch):
+	source = "(print (add 1 2))"
+	sections = template.Program(protos="", variables="", functions="", main="")
+
+	cache = CompileCache(directory)
+	cache.put(cache.key(source), sections)
+	assert CompileCache(directory).get(cache.key(source)) == sections
+
+	# a change to any source of the compiler or the runtime gives other keys
+	monkeypatch.setattr(fingerprint, "_digest", None)
+	monkeypatch.setattr(fingerprint, "sources", lambda: [template.RUNTIME])
+	other = CompileCache(directory)
+	assert other.key(source) != cache.key(source)
+	assert other.get(other.key(source)) is None
+
+
+def test_cache_evicts_least_recently_used(directory):
+	sections = template.Program(protos="", variables="", functions="x" * 1000, main="")
+	cache = CompileCache(directory, max_size=3500)
+	keys = [cache.key("(print {})".format(i)) for i in range(4)]
+	for age, key in enumerate(keys[:3]):
+		cache.put(key, sections)
+		os.utime(cache.path(key), (age, age))
+
+	# a hit refreshes the first entry, the second one is then the oldest
+	assert cache.get(keys[0]) == sections
+	cache.put(keys[3], sections)
+	assert cache.get(keys[1]) is None
+	for key in (keys[0], keys[2], keys[3]):
+		assert cache.get(key) == sections
+	assert (cache.hits, cache.misses) == (4, 1)
+
+
+def test_fingerprint_covers_runtime_and_compiler():
+	sources = [os.path.relpath(path, ROOT) for path in fingerprint.sources()]
+	for name in ("argument.py", "scope.py", "optimizer.py", os.path.join("wp", "emitter.py"),
+				os.path.join("test", "output", "lisp_def.c"), os.path.join("test", "output", "lisp_def.h")):
+		assert name in sources
+
+
+def test_incremental_reuses_callees_of_restored_definitions(directory):
+	# id is only called from g, it's used when g is restored
+	path = write(directory, "calls.wp", "(def id (x) x) (def g (a) (add (id a) 1)) "
+										"(def h (b) (add b 1)) (print (g 3) (h 4))")
+	state = os.path.join(directory, "state")
+	plain, _ = whisper(path)
+
+	out, err = whisper(path, "--incremental", state)
+	assert "0 reused, 3 compiled" in err and out == plain
+	for _ in range(2):
+		out, err = whisper(path, "--incremental", state)
+		assert "3 reused, 0 compiled" in err and out == plain
+
+
+def test_incremental_state_does_not_depend_on_jobs(directory):
+	path = write(directory, "jobs.wp", "(def id (x) x) (def g (a) (if a 1 (id a))) "
+										"(def h (b) (add b 1)) (print (g 3) (h 4) (id \"s\"))")
+	plain, _ = whisper(path)
+
+	states = []
+	for jobs in ("1", "2"):
+		state = os.path.join(directory, "state" + jobs)
+		for _ in range(2):
+			out, err = whisper(path, "--incremental", state, "-j", jobs)
+			assert out == plain
+		assert "3 reused, 0 compiled" in err
+		with open(state) as f:
+			states.append(f.read())
+	assert states[0] == states[1]
+
+
+def test_folded_and_or_are_booleans(directory):
+	path = write(directory, "and.wp", "(print (and 2 3) (or 0 5) (and 0 4) (or 2 0))")
+	plain, _ = whisper(path)
+	folded, _ = whisper(path, "-O")
+
+	assert "printf(\"%d %d %d %d\\n\",1, 1, 0, 1)" in folded
+	assert execute(directory, folded) == execute(directory, plain) == "1 1 0 1\n"
+	assert whisper(path, "--run")[0] == "1 1 0 1\n"
+
+
+OPERATIONS = """
+(def f (a b)
+	(print (add a b 1) (sub a b) (sub a) (mul a b 2) (div a b) (mod a b) (div -7 2) (neg a)
+		(lt a b) (le a a) (gt a b) (ge b a) (eq a a 1) (ne a b) (not a) (not 0)
+		(and a 0) (or 0 b) (if (lt a b) (add a 10) (sub b 10))))
+(f 7 3)
+(f -7 2)
+(f 0 5)
+"""
+
+def test_run_matches_the_generated_c(directory):
+	path = write(directory, "operations.wp", OPERATIONS)
+	run, _ = whisper(path, "--run")
+	assert run == execute(directory, whisper(path)[0])
+	assert len(run.splitlines()) == 3
+
+
+def test_codegen_reads_variables_by_address(directory, monkeypatch):
+	source = ("(def f (a b) (seq (set c (add a b)) (set c (mul c 2)) c)) "
+			  "(set x (f 1 2)) (print x (f x 3))")
+	program = Argument(source, scope=Scope())
+	program.resolve()
+
+	# once the program is resolved, the variables aren't searched by name
+	def search(*args):
+		raise AssertionError("variable searched by name")
+	monkeypatch.setattr(VarArgument, "resolve", lambda self: None)
+	monkeypatch.setattr(SymbolTable, "find", search)
+	monkeypatch.setattr(SymbolTable, "slot", search)
+
+	emitter = Emitter(HelperTable())
+	program.emit(emitter)
+	assert template.program(emitter.program()) + "\n" == whisper(write(directory, "f.wp", source))[0]
+
+
+def examples():
+	"""
+		@returns 	test/test.wp with its commented calls, hello_name is left out
+					(string parameters aren't supported)
+	"""
+	with open(os.path.join(ROOT, "test", "test.wp")) as f:
+		lines = f.read().splitlines()
+	return "\n".join(line[1:] if line.startswith(";(") else line 
+					for line in lines if "hello_name \"" not in line)
+
+PROGRAMS = {
+	"examples": examples(),
+	"strings": """
+(def greet (name)
+	(seq
+		(set greeting "hello")
+		(print greeting name)
+		name))
+(def same (a b)
+	(if (eq a b) "same" "different"))
+(set who (greet "world"))
+(print (same who "world") (same who "hello") (ne who "x"))
+(set line (reads))
+(print "read:" line (same line "world"))
+""",
+	"vectors": """
+(def square (x) (mul x x))
+(def larger (a b) (if (gt a b) a b))
+(def id (x) x)
+(def fill (v i)
+	(seq
+		(while (lt i (vlen v))
+			(seq
+				(vset v i (sub (mul i 7) 40))
+				(set i (add i 1))))
+		v))
+(set v (fill (vec 10) 0))
+(print (vref v 3) (vlen (vmap square v)) (vsum v) (vfold larger (vref v 0) v))
+(print (id 1) (id "polymorphic") (vsum (id v)))
+""",
+	"tail calls": """
+(def count_down (n acc)
+	(if (eq n 0)
+		acc
+		(count_down (sub n 1) (add acc n))))
+(def gcd (a b)
+	(if (eq b 0) a (gcd b (mod a b))))
+(print (count_down 100 0) (gcd 1071 462) (and 2 3) (or 0 (add 2 3)))
+""",
+	"recursion": """
+(def fib (n) (if (lt n 2) n (add (fib (sub n 1)) (fib (sub n 2)))))
+(def fact (n) (if (le n 1) 1 (mul n (fact (sub n 1)))))
+(def sum_halves (n)
+	(seq
+		(set half (div n 2))
+		(if (eq n 0) 0 (add (sum_halves (sub n 1)) half))))
+(print (fib 10) (fact 6) (sum_halves 10))
+""",
+}
+
+# programs whose recursion doesn't end with --if-runtime
+RECURSIVE = ("tail calls", "recursion")
+
+MODES = [["-O"], ["--stream"], ["-j", "2"], ["--stream", "-j", "2"], ["--inline"], ["--if-runtime"]]
+
+@pytest.mark.parametrize("name", sorted(PROGRAMS))
+def test_build_modes_give_the_same_output(directory, name):
+	path = write(directory, "program.wp", PROGRAMS[name])
+	expected = execute(directory, whisper(path)[0], input="world\n")
+	assert expected
+
+	for mode in MODES:
+		# the __if_* functions of lisp_def.c evaluate both branches, recursion wouldn't end
+		if mode == ["--if-runtime"] and name in RECURSIVE:
+			continue
+		code, _ = whisper(path, *mode)
+		assert execute(directory, code, input="world\n") == expected, mode
+	assert whisper(path, "--run", input="world\n")[0] == expected
+
+
+def test_recursive_calls_keep_the_variables_of_the_caller(directory):
+	path = write(directory, "fib.wp", PROGRAMS["recursion"])
+	assert execute(directory, whisper(path)[0]) == "55 720 25\n"
+
+
+def read(path):
+	with open(path) as f:
+		return f.read()
+
+
+def test_batch_compiles_directories_and_manifests(directory):
+	sources = os.path.join(directory, "sources")
+	one = write(sources, "one.wp", "(print 1)")
+	two = write(sources, os.path.join("more", "two.wp"), "(print 2)")
+	three = write(directory, "three.wp", "(print 3)")
+	manifest = write(directory, "manifest", "three.wp # a comment\n\n")
+
+	out = os.path.join(directory, "out")
+	_, err = whisper(sources, "--manifest", manifest, "-o", out)
+	assert "batch: 3 compiled, 0 failed" in err
+	for source, target in ((one, "one.c"), (two, os.path.join("more", "two.c")), (three, "three.c")):
+		assert read(os.path.join(out, target)) == whisper(source)[0]
+
+	# without -o the C files are next to their sources
+	whisper(sources, "--workers", "2")
+	assert read(os.path.join(sources, "more", "two.c")) == whisper(two)[0]
+
+
+def test_batch_fails_if_a_file_fails(directory):
+	good = write(directory, "good.wp", "(print 1)")
+	bad = write(directory, "bad.wp", "(print (unknown 1))")
+	out = os.path.join(directory, "out")
+
+	_, err = whisper(good, bad, "-o", out, status=1)
+	assert "batch: 1 compiled, 1 failed" in err and bad in err
+	assert os.listdir(out) == ["good.c"]
+
+
+def test_batch_refuses_sources_with_the_same_c_file(directory):
+	first = write(directory, os.path.join("d1", "x.wp"), "(print 1)")
+	second = write(directory, os.path.join("d2", "x.wp"), "(print 2)")
+	out = os.path.join(directory, "out")
+
+	_, err = whisper(first, second, "-o", out, "--workers", "2", status=1)
+	assert "{}: same C file as {}".format(second, first) in err
+	assert not os.path.exists(out)
+
+
+def test_read_forms_in_small_chunks():
+	source = examples() + PROGRAMS["strings"] + '\n(print "(not a form" ")") ; a comment (\n(print 1)'
+
+	def compile(program, forms=None):
+		emitter = Emitter(HelperTable())
+		program.emit(emitter, forms)
+		return template.program(emitter.program())
+
+	whole = compile(Argument(source, scope=Scope()))
+	forms = list(read_forms(StringIO(source)))
+	assert forms[-2:] == ['(print "(not a form" ")")', "(print 1)"]
+	for chunk_size in (1, 2, 3, 7, 64):
+		assert list(read_forms(StringIO(source), chunk_size=chunk_size)) == forms
+		streamed = compile(Argument(None, scope=Scope()), read_forms(StringIO(source), chunk_size))
+		assert streamed == whole
+
+
+def test_scopes_share_their_empty_containers():
+	program = Argument(PROGRAMS["recursion"] + examples(), scope=Scope())
+	program.emit(Emitter(HelperTable()))
+	# the empty containers of the class are never written to (see Scope.own)
+	for name in ("scopes", "functions", "variants", "types", "helpers", "protos",
+				"literals", "callees", "fragment", "used"):
+		assert not getattr(Scope, name), name
+	scope = program.scope.scopes["fib"]
+	assert "helpers" not in scope.__dict__ and "literals" not in scope.__dict__
+
+
+def test_server_round_trip(directory):
+	path = write(directory, "examples.wp", examples())
+	address = os.path.join(directory, "socket")
+	plain, _ = whisper(path)
+
+	server = subprocess.Popen([sys.executable, os.path.join(ROOT, "whisper.py"), "--serve", address],
+					stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	try:
+		for _ in range(100):
+			if os.path.exists(address):
+				break
+			time.sleep(0.05)
+		first = client.compile(address, filename=path)
+		second = client.compile(address, filename=path)
+		assert first["code"] == second["code"] == plain
+		assert (first["cached"], second["cached"]) == (False, True)
+
+		# a second server doesn't take the socket of the running one
+		_, err = whisper("--serve", address, status=1)
+		assert "already listening" in err
+		assert client.compile(address, source=examples())["code"] == plain
+	finally:
+		server.send_signal(signal.SIGINT)
+		_, err = server.communicate()
+	assert "3 requests, 2 cache hits" in err
+
+
+def test_server_replaces_stale_socket(directory):
+	address = os.path.join(directory, "socket")
+	stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	stale.bind(address)
+	stale.close()
+
+	server = CompileServer(address, lambda source, options: source)
+	server.server_close()
+	assert not os.path.exists(address)
@@ -1,11 +1,332 @@
+import os
+import sys
+import copy
+import socket
+import multiprocessing
+from cStringIO import StringIO
+
 from argument import Argument
+from interpreter import Interpreter
+from optimizer import ConstantFolder
+from scope import Scope, StaleFragment, HelperTable
+from wp import template, stats
+from wp.cache import CompileCache
+from wp.emitter import Emitter
+from wp.incremental import BuildState
+from wp.parser import read_forms
+from wp.server import CompileServer
+
+
+def compile_incremental(f, state, scope_options, helpers, **kwargs):
+	"""
+		Compiles the file reusing the code of the definitions that didn't change,
+		compiles again (without reusing it) any definition whose code turns out stale
+
+		@returns 	wp.emitter.Emitter with the code
+	"""
+	while True:
+		emitter = Emitter(helpers)
+		try:
+			Argument(None, scope=Scope(options=scope_options))\
+				.emit(emitter, read_forms(f), state, **kwargs)
+			return emitter
+		except StaleFragment as stale:
+			state.invalidate(stale.name)
+			helpers.clear()
+			f.seek(0)
+
+
+def codegen_options(options):
+	"""
+		@returns 	the options that change the generated code
+	"""
+	return [flag for flag, enabled in (("-O", options.optimize),
+										("--inline", options.inline),
+										("--if-runtime", options.if_runtime))
+			if enabled]
+
+
+def compile_program(f, options):
+	"""
+		@returns 	wp.emitter.Emitter with the code of the file
+	"""
+	scope_options = {"inline": options.inline, "if_runtime": options.if_runtime}
+	helpers = HelperTable()
+	passes = []
+	if options.optimize:
+		folder = ConstantFolder()
+		passes.append(folder.fold)
+
+	if options.incremental:
+		state = BuildState(options.incremental, codegen_options(options))
+		emitter = compile_incremental(f, state, scope_options, helpers,
+										jobs=options.jobs, passes=passes)
+		state.save()
+		sys.stderr.write("incremental: {} reused, {} compiled\n".format(state.reused, state.compiled))
+	elif options.stream:
+		emitter = Emitter(helpers)
+		Argument(None, scope=Scope(options=scope_options))\
+			.emit(emitter, read_forms(f), jobs=options.jobs, passes=passes)
+	else:
+		emitter = Emitter(helpers)
+		with stats.phase("parse"):
+			program = Argument(f.read(), scope=Scope(options=scope_options))
+		program.emit(emitter, jobs=options.jobs, passes=passes)
+
+	if options.optimize:
+		sys.stderr.write("optimizer: {} nodes eliminated\n".format(folder.eliminated))
+	if helpers.removed:
+		sys.stderr.write("helpers: {} duplicates removed\n".format(helpers.removed))
+	return emitter
+
+
+def compile_file(f, options, out, cache=None):
+	"""
+		Compiles the file, writing the C file to out
+
+		@arg cache 	(optional) wp.cache.CompileCache with the output of previous compilations
+		@returns 	number of bytes written
+	"""
+	if cache is not None:
+		key = cache.key(f, codegen_options(options))
+		sections = cache.get(key)
+		if sections is None:
+			sections = compile_program(f, options).program()
+			cache.put(key, sections)
+		with stats.phase("emit"):
+			code = template.program(sections)
+			out.write(code + "\n")
+		return len(code) + 1
+
+	emitter = compile_program(f, options)
+	with stats.phase("emit"):
+		size = emitter.write(out)
+		out.write("\n")
+	return size + 1
+
+
+def batch_sources(paths, manifest=None):
+	"""
+		Source files of a batch compilation: the files given, the .wp files found
+		in the directories given and the files listed in the manifest 
+		(one path per line, relative to the manifest, '#' starts a comment)
+
+		@returns 	list of (path, path of the output relative to the output directory)
+	"""
+	sources = []
+	for path in paths:
+		if not os.path.isdir(path):
+			sources.append((path, os.path.basename(path)))
+			continue
+		for directory, dirs, files in os.walk(path):
+			dirs.sort()
+			for name in sorted(files):
+				if name.endswith(".wp"):
+					source = os.path.join(directory, name)
+					sources.append((source, os.path.relpath(source, path)))
+
+	if manifest:
+		base = os.path.dirname(manifest)
+		with open(manifest) as f:
+			for line in f:
+				line = line.split("#", 1)[0].strip()
+				if line:
+					sources.append((os.path.join(base, line), line))
+	return sources
+
+# options and cache of the process compiling the files of a batch
+_batch = None
+
+def _init_batch(options):
+	global _batch
+	cache = CompileCache(options.cache, max_size=options.cache_size) if options.cache else None
+	_batch = (options, cache)
+
+def _compile_to(job):
+	"""
+		Compiles a file of a batch, each one is parsed into its own scope tree 
+		(see compile_program)
+
+		@arg job 	(source path, output path)
+		@returns 	(source path, error message or None)
+	"""
+	source, target = job
+	options, cache = _batch
+	# the C file is only replaced once the compilation succeeds
+	partial = target + ".tmp"
+	try:
+		directory = os.path.dirname(target)
+		if directory and not os.path.isdir(directory):
+			os.makedirs(directory)
+		with open(source) as f, open(partial, "w") as out:
+			compile_file(f, options, out, cache)
+		os.rename(partial, target)
+	except Exception as error:
+		if os.path.exists(partial):
+			os.remove(partial)
+		return source, str(error) or type(error).__name__
+	return source, None
+
+def compile_batch(sources, options, output_dir=None, workers=1):
+	"""
+		Compiles many files in this process, or in a pool of workers processes.
+		The C file is written next to its source, or into output_dir.
+
+		Nothing is compiled if two sources have the same C file 
+		(files with the same name given from different directories).
+
+		@arg sources 	list given by batch_sources
+		@returns 	number of files that didn't compile
+	"""
+	jobs = [(source, os.path.join(output_dir, os.path.splitext(relative)[0] + ".c") 
+						if output_dir else os.path.splitext(source)[0] + ".c")
+			for source, relative in sources]
+
+	targets = {}
+	conflicts = 0
+	for source, target in jobs:
+		first = targets.setdefault(os.path.abspath(target), source)
+		if first != source:
+			sys.stderr.write("{}: same C file as {} ({})\n".format(source, first, target))
+			conflicts += 1
+	if conflicts:
+		sys.stderr.write("batch: nothing compiled, {} conflicting C files\n".format(conflicts))
+		return conflicts
+
+	if workers > 1 and len(jobs) > 1:
+		pool = multiprocessing.Pool(min(workers, len(jobs)), _init_batch, (options,))
+		try:
+			results = pool.map(_compile_to, jobs, chunksize=1)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		_init_batch(options)
+		results = map(_compile_to, jobs)
+
+	failed = 0
+	for source, error in results:
+		if error:
+			sys.stderr.write("{}: {}\n".format(source, error))
+			failed += 1
+	sys.stderr.write("batch: {} compiled, {} failed\n".format(len(jobs) - failed, failed))
+	return failed
+
+
+# options a request to the compile server can give
+SERVER_OPTIONS = ("optimize", "inline", "if_runtime", "stream")
+
+def serve(path, options):
+	"""
+		Runs a compile server on the Unix socket path until interrupted (see wp.server),
+		the options of a request replace the ones given to whisper.py
+
+		@returns 	exit status, 1 if another server is listening on path
+	"""
+	cache = CompileCache(options.cache, max_size=options.cache_size) if options.cache else None
+
+	def compile(source, request_options):
+		compile_options = copy.copy(options)
+		for name in SERVER_OPTIONS:
+			if name in request_options:
+				setattr(compile_options, name, bool(request_options[name]))
+		out = StringIO()
+		compile_file(StringIO(source), compile_options, out, cache)
+		return out.getvalue()
+
+	try:
+		server = CompileServer(path, compile)
+	except socket.error as error:
+		sys.stderr.write("{}: {}\n".format(path, error.strerror or error))
+		return 1
+	sys.stderr.write("serving on {}\n".format(path))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		sys.stderr.write("server: {} requests, {} cache hits\n".format(server.requests, server.hits))
+	return 0
+
 
 if __name__ == '__main__':
-	import sys
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Whisper, a Lisp to C transpiler")
+	parser.add_argument("paths", nargs="*", metavar="path",
+		help="whisper source file, or several files and directories of .wp files to compile in a batch")
+	parser.add_argument("--manifest", metavar="FILE",
+		help="compile in a batch the files listed in FILE, one per line")
+	parser.add_argument("-o", "--output-dir", metavar="DIR",
+		help="write the C files of a batch into DIR instead of next to their sources")
+	parser.add_argument("--workers", metavar="N", type=int, default=1,
+		help="compile the files of a batch in N processes")
+	parser.add_argument("--serve", metavar="SOCKET",
+		help="run a compile server on the Unix socket SOCKET, see wp.client")
+	parser.add_argument("--stream", action="store_true",
+		help="read and compile one top-level form at a time")
+	parser.add_argument("--cache", metavar="DIR",
+		help="reuse the output of previous compilations stored in DIR")
+	parser.add_argument("--cache-size", metavar="BYTES", type=int, default=64 << 20,
+		help="maximum size of the cache directory (default: 64MB)")
+	parser.add_argument("--incremental", metavar="STATE",
+		help="only compile the definitions that changed since the compilation saved in STATE")
+	parser.add_argument("-j", "--jobs", metavar="N", type=int, default=1,
+		help="generate the code of independent definitions in N processes")
+	parser.add_argument("-O", dest="optimize", action="store_true",
+		help="fold constant expressions before generating C")
+	parser.add_argument("--inline", action="store_true",
+		help="compile seq, print and while bodies to inline C instead of helper functions")
+	parser.add_argument("--if-runtime", action="store_true",
+		help="compile if to the __if_* functions of lisp_def.c instead of C conditionals")
+	parser.add_argument("--run", action="store_true",
+		help="run the program instead of generating C")
+	parser.add_argument("--stats", action="store_true",
+		help="report the time and memory of each phase and the compiler's counters")
+	options = parser.parse_args()
+
+	if options.serve:
+		if options.paths or options.manifest or options.run or options.incremental:
+			parser.error("--serve compiles the files its clients send")
+		# the server's threads don't start processes
+		options.jobs = 1
+		sys.exit(serve(options.serve, options))
+
+	batch = (options.manifest or options.output_dir or len(options.paths) != 1 
+				or os.path.isdir(options.paths[0]))
+	if batch:
+		if not options.paths and not options.manifest:
+			parser.error("no source files given")
+		if options.run or options.incremental:
+			parser.error("--run and --incremental take a single source file")
+		# the workers of a batch can't start processes of their own
+		if options.workers > 1:
+			options.jobs = 1
+
+	if options.stats:
+		collector = stats.Stats()
+		stats.add_hook(collector)
 
-	if len(sys.argv) != 2:
-		sys.exit(1)
+	if options.run:
+		with open(options.paths[0]) as f:
+			Interpreter().run(Argument(f.read()))
+		sys.exit(0)
 
-	with open(sys.argv[1]) as f:
-		print Argument(f.read()).compile()
+	status = 0
+	if batch:
+		status = int(compile_batch(batch_sources(options.paths, options.manifest), options,
+									options.output_dir, options.workers) > 0)
+	else:
+		with open(options.paths[0]) as f:
+			cache = None
+			if options.cache:
+				cache = CompileCache(options.cache, max_size=options.cache_size)
+			size = compile_file(f, options, sys.stdout, cache)
+			if cache is not None:
+				sys.stderr.write("cache: {} hits, {} misses\n".format(cache.hits, cache.misses))
+			stats.count("bytes", size)
 
+	if options.stats:
+		collector.report(sys.stderr)
+	sys.exit(status)
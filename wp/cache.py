@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import tempfile
+
+from wp import template, fingerprint
+
+
+class CompileCache:
+	"""
+		On-disk cache of compiled programs, addressed by the hash of everything
+		the output depends on: the source text, the compiler's sources and the runtime 
+		(see wp.fingerprint) and the compilation options.
+
+		Each entry is a json file with the sections of the C file (template.Program).
+		The directory is kept under max_size bytes by removing the least recently
+		used entries (a hit refreshes the entry's modification time).
+
+		- hits, misses : counters for this cache object
+	"""
+
+	def __init__(self, directory, max_size=64 << 20):
+		self.directory = directory
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		self.compiler_digest = fingerprint.digest()
+
+	def key(self, source, options=()):
+		"""
+			@arg source 	source text or file object, a file is read in chunks and rewound
+			@arg options 	(optional) compilation options that change the output
+			@returns 	the key for this compilation
+		"""
+		digest = hashlib.sha256(self.compiler_digest)
+		digest.update(repr(sorted(options)))
+
+		if isinstance(source, basestring):
+			digest.update(source)
+		else:
+			for chunk in iter(lambda: source.read(1 << 16), ""):
+				digest.update(chunk)
+			source.seek(0)
+
+		return digest.hexdigest()
+
+	def path(self, key):
+		return os.path.join(self.directory, key + ".json")
+
+	def get(self, key):
+		"""
+			@returns 	template.Program or None
+		"""
+		path = self.path(key)
+		try:
+			with open(path) as f:
+				entry = json.load(f)
+			sections = template.Program(**dict((name, code.encode("utf-8"))
+												for name, code in entry.items()))
+		except (IOError, ValueError, TypeError, AttributeError):
+			self.misses += 1
+			return None
+
+		try:
+			os.utime(path, None)
+		except OSError:
+			pass # evicted meanwhile by another process using the cache
+		self.hits += 1
+		return sections
+
+	def put(self, key, sections):
+		"""
+			Stores the sections of a compiled program, then evicts old entries
+
+			@arg key 		key returned by self.key
+			@arg sections 	template.Program
+		"""
+		fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+		with os.fdopen(fd, "w") as f:
+			json.dump(sections._asdict(), f)
+		os.rename(tmp, self.path(key))
+
+		self.evict()
+
+	def evict(self):
+		entries = []
+		for name in os.listdir(self.directory):
+			if not name.endswith(".json"):
+				continue
+			try:
+				stat = os.stat(os.path.join(self.directory, name))
+			except OSError:
+				continue # evicted meanwhile by another process
+			entries.append((stat.st_mtime, stat.st_size, name))
+
+		size = sum(entry[1] for entry in entries)
+		for _, entry_size, name in sorted(entries):
+			if size <= self.max_size:
+				break
+			try:
+				os.remove(os.path.join(self.directory, name))
+			except OSError:
+				pass
+			size -= entry_size
@@ -0,0 +1,76 @@
+"""
+	Client of the compile server (whisper.py --serve), it doesn't load the compiler.
+	Writes the C file to stdout, a path of - sends the source read from stdin.
+
+	usage: python -m wp.client SOCKET path [-O] [--inline] [--if-runtime] [--stream] [--time]
+"""
+import os
+import sys
+import json
+import socket
+
+
+def request(path, message):
+	"""
+		Sends a request to the server listening on the Unix socket path (see wp.server)
+
+		@returns 	the response
+	"""
+	client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		client.connect(path)
+		client.sendall(json.dumps(message) + "\n")
+		return json.loads(client.makefile("r").readline())
+	finally:
+		client.close()
+
+
+def compile(path, source=None, filename=None, **options):
+	"""
+		@arg path 		path of the server's socket
+		@arg source 	source text, or
+		@arg filename 	source file, read by the server
+		@arg options 	code generation options: optimize, inline, if_runtime, stream
+		@returns 	the response, see wp.server.CompileServer
+	"""
+	message = {"options": options}
+	if source is not None:
+		message["source"] = source
+	else:
+		message["path"] = os.path.abspath(filename)
+	return request(path, message)
+
+
+if __name__ == '__main__':
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Compiles a file with a whisper compile server")
+	parser.add_argument("socket", help="socket of the server (whisper.py --serve SOCKET)")
+	parser.add_argument("path", help="whisper source file, - for stdin")
+	parser.add_argument("-O", dest="optimize", action="store_true",
+		help="fold constant expressions before generating C")
+	parser.add_argument("--inline", action="store_true",
+		help="compile seq, print and while bodies to inline C instead of helper functions")
+	parser.add_argument("--if-runtime", action="store_true",
+		help="compile if to the __if_* functions of lisp_def.c instead of C conditionals")
+	parser.add_argument("--stream", action="store_true",
+		help="read and compile one top-level form at a time")
+	parser.add_argument("--time", action="store_true",
+		help="report the time the server took")
+	options = parser.parse_args()
+
+	codegen = dict((name, True) for name in ("optimize", "inline", "if_runtime", "stream")
+					if getattr(options, name))
+	if options.path == "-":
+		response = compile(options.socket, source=sys.stdin.read(), **codegen)
+	else:
+		response = compile(options.socket, filename=options.path, **codegen)
+
+	if "error" in response:
+		sys.stderr.write("{}\n".format(response["error"]))
+		sys.exit(1)
+
+	sys.stdout.write(response["code"].encode("utf-8"))
+	if options.time:
+		sys.stderr.write("server: {:.2f} ms{}\n".format(response["seconds"] * 1000, 
+													" (cached)" if response["cached"] else ""))
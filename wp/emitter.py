@@ -0,0 +1,112 @@
+from itertools import chain
+
+from wp import template
+
+
+class Emitter:
+	"""
+		Receives the code generated for the C file piece by piece (see Scope.emit),
+		each piece is kept once in the buffer of its section and the buffers are 
+		written to the output without being joined (see Emitter.write), 
+		so the output costs linear time and no copies of the code.
+
+		Given a scope.HelperTable, helpers with the same code are only defined once
+		and the calls to the duplicates are renamed. Without one, the helpers are kept 
+		as [type, name, body], the form stored in a scope's fragment (see Emitter.fragment).
+	"""
+
+	def __init__(self, helpers=None):
+		self.helpers = helpers
+		self.helper_protos = []
+		self.helper_definitions = []
+		self.protos = []
+		self.literals = [] # [name, text]
+		self.interned = set() # names of the literals
+		self.structs = []
+		self.functions = []
+		self.calls = []
+
+	def helper(self, type, name, body):
+		if self.helpers is None:
+			self.helper_definitions.append([type, name, body])
+			return
+
+		code = self.helpers.add(type, name, body)
+		if code:
+			proto, definition = code
+			self.helper_protos.append(proto)
+			self.helper_definitions.append(definition)
+
+	def proto(self, code):
+		self.protos.append(code)
+
+	def literal(self, name, text):
+		"""
+			Adds a string literal to the constant pool (see Scope.literal), once
+		"""
+		if name not in self.interned:
+			self.interned.add(name)
+			self.literals.append([name, text])
+
+	def struct(self, code):
+		self.structs.append(code)
+
+	def function(self, code):
+		self.functions.append(self.rename(code))
+
+	def call(self, code):
+		self.calls.append(self.rename(code))
+
+	def rename(self, code):
+		return self.helpers.rename(code) if self.helpers is not None else code
+
+	def code(self, fragment):
+		"""
+			Writes the code of a scope generated before (see Scope.fragment)
+		"""
+		for helper in fragment["helpers"]:
+			self.helper(*helper)
+		for proto in fragment["protos"]:
+			self.proto(proto)
+		for literal in fragment["literals"]:
+			self.literal(*literal)
+		for function in fragment["functions"]:
+			self.function(function)
+		if fragment["variables"]:
+			self.struct(fragment["variables"])
+
+	def fragment(self):
+		"""
+			@returns 	the code received, as the fragment of a scope
+		"""
+		return {
+			"helpers": self.helper_definitions,
+			"protos": self.protos,
+			"literals": self.literals,
+			"functions": self.functions,
+			"variables": '\n'.join(self.structs),
+		}
+
+	def program(self):
+		"""
+			@returns 	a template.Program with the code of each section
+		"""
+		return template.Program(**dict((section, separator.join(pieces)) 
+								for section, (separator, pieces) in self.sections().items()))
+
+	def write(self, out):
+		"""
+			Writes the C file to out
+
+			@returns 	number of bytes written
+		"""
+		return template.write(out, self.sections())
+
+	def sections(self):
+		return {
+			"protos": ("\n", chain(self.helper_protos, self.protos)),
+			"variables": ("\n", chain(("__str_literal({}, \"{}\");".format(name, text)
+											for name, text in self.literals), self.structs)),
+			"functions": ("\n", chain(self.helper_definitions, self.functions)),
+			"main": (";\n", self.calls),
+		}
@@ -0,0 +1,42 @@
+import os
+import glob
+import hashlib
+
+from wp import template
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules of the compiler outside of wp/
+MODULES = ("whisper.py", "argument.py", "scope.py", "optimizer.py")
+
+_digest = None
+
+
+def sources():
+	"""
+		@returns 	paths of the files the generated code depends on: the compiler's modules
+					and the runtime (lisp_def.c, lisp_def.h)
+	"""
+	runtime = os.path.dirname(template.RUNTIME)
+	return ([os.path.join(_root, name) for name in MODULES]
+			+ sorted(glob.glob(os.path.join(_root, "wp", "*.py")))
+			+ [template.RUNTIME, os.path.join(runtime, "lisp_def.h")])
+
+
+def digest():
+	"""
+		Digest of the compiler and the runtime, computed once per process, 
+		any change to them invalidates the cache (wp.cache) and the build states (wp.incremental)
+
+		@returns 	hex digest
+	"""
+	global _digest
+	if _digest is None:
+		sha = hashlib.sha256()
+		for path in sources():
+			if os.path.exists(path):
+				sha.update(os.path.relpath(path, _root) + "\0")
+				with open(path, "rb") as f:
+					sha.update(f.read())
+		_digest = sha.hexdigest()
+	return _digest
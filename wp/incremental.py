@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+import tempfile
+
+from wp import fingerprint
+
+
+def _encode(obj):
+	"""
+		json gives back unicode strings, the compiler works with str
+	"""
+	if isinstance(obj, unicode):
+		return obj.encode("utf-8")
+	if isinstance(obj, list):
+		return [_encode(item) for item in obj]
+	if isinstance(obj, dict):
+		return dict((_encode(key), _encode(value)) for key, value in obj.items())
+	return obj
+
+
+class BuildState:
+	"""
+		Code generated for each top-level definition of a file by its previous compilation,
+		stored as json so the next compilation only has to type and compile the definitions
+		that changed (and the ones calling them), see DefArgument.restore.
+
+		A state saved by a different compiler or runtime (see wp.fingerprint) is ignored.
+
+		- reused, compiled : number of definitions restored / compiled by this compilation
+	"""
+
+	def __init__(self, path, options=()):
+		self.path = path
+		self.options = repr(sorted(options))
+		self.previous = {}
+		self.current = {}
+		self.invalid = set()
+		self.reused = 0
+		self.compiled = 0
+
+		try:
+			with open(path) as f:
+				state = _encode(json.load(f))
+		except (IOError, ValueError):
+			return
+
+		if state.get("compiler") == fingerprint.digest() and state.get("options") == self.options:
+			self.previous = state["definitions"]
+
+	@staticmethod
+	def digest(text):
+		return hashlib.sha1(text).hexdigest()
+
+	def get(self, name, digest):
+		"""
+			@returns 	the fragment saved for the definition, if its source didn't change
+		"""
+		entry = self.previous.get(name)
+		if entry and entry["digest"] == digest and name not in self.invalid:
+			return entry["fragment"]
+
+	def put(self, name, digest, fragment, restored):
+		self.current[name] = {"digest": digest, "fragment": fragment}
+		if restored:
+			self.reused += 1
+		else:
+			self.compiled += 1
+
+	def invalidate(self, name):
+		"""
+			Don't reuse the fragment of this definition (see scope.StaleFragment),
+			resets the state of the current compilation so it can start again
+		"""
+		self.invalid.add(name)
+		self.current = {}
+		self.reused = 0
+		self.compiled = 0
+
+	def save(self):
+		directory = os.path.dirname(os.path.abspath(self.path))
+		fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+		with os.fdopen(fd, "w") as f:
+			json.dump({
+				"compiler": fingerprint.digest(),
+				"options": self.options,
+				"definitions": self.current,
+			}, f)
+		os.rename(tmp, self.path)
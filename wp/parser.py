@@ -1,83 +1,172 @@
+import re
 import string
-
-class Parser:
-
-	def __init__(self, parser_object_fn):
-		self.findArgument = parser_object_fn["argument"]
-		self.findString = parser_object_fn["string"]
-		self.findInteger = parser_object_fn["integer"]
-		self.findVariable = parser_object_fn["variable"]
-
-		self.variable_start = string.lowercase + "_"
-
-	def parse(self, args):
-		
-		while args:
-			args = args.strip()
-			if args[0] == ";":
-				args = self.__parse_comment(args)
-			elif args[0] == "(":
-				args = self.__parse_call(args)
-			elif args[0] == "\"":
-				args = self.__parse_string(args)
+from collections import namedtuple
+
+Token = namedtuple('Token', ['kind', 'value', 'start', 'end'])
+
+TOKEN_RE = re.compile(r"""
+	(?P<space>\s+)
+	|(?P<comment>;[^\n]*)
+	|(?P<open>\()
+	|(?P<close>\))
+	|(?P<string>"[^"]*")
+	|(?P<atom>[^\s()";]+)
+""", re.VERBOSE)
+
+variable_start = string.lowercase + string.uppercase + "_"
+
+
+def tokenize(text, pos=0, end=None):
+	"""
+		Walks the text with a single cursor, yielding a Token for every
+		parenthesis, string, variable and integer found between pos and end.
+		Whitespace and comments are skipped, the text is never sliced
+		except for the token values themselves.
+
+		@arg text 	source code
+		@arg pos 	(optional) offset where tokenization starts
+		@arg end 	(optional) offset where tokenization stops
+
+		@returns 	generator of Token(kind, value, start, end),
+					kind is one of "open", "close", "string", "variable", "integer"
+	"""
+	end = len(text) if end is None else end
+	match = TOKEN_RE.match
+
+	while pos < end:
+		m = match(text, pos, end)
+		if not m:
+			raise Exception("Unterminated string starting at offset {}".format(pos))
+
+		kind = m.lastgroup
+		start, pos = m.span()
+
+		if kind == "space" or kind == "comment":
+			continue
+		elif kind == "string":
+			yield Token("string", text[start + 1:pos - 1], start, pos)
+		elif kind == "atom":
+			value = m.group()
 			# If variable (or function), first character must be a letter or underscore
-			elif args[0].lower() in self.variable_start:
-				args = self.__parse_var(args)			
-			else:
-				args = self.__parse_int(args)
-
-	def __parse_comment(self, args):
-		stop = args.find("\n") + 1 # stop on
-		if stop: # the rest of file is a comment
-			return args[stop:]
-		return None
-
-
-	def __parse_call(self, args):
-		count = 1
-		i = 1
-		while count:
-			if args[i] == ")":
-				count -= 1
-			elif args[i] == "(":
-				count += 1
-			i +=1
-			
-		if count:
-			raise Exception("Incompatible parenthesis")
+			yield Token("variable" if value[0] in variable_start else "integer", value, start, pos)
+		else:
+			yield Token(kind, m.group(), start, pos)
 
-		expression = args[1:i-1] ## add 1 2
 
-		self.findArgument(expression)
-
-		return args[i:] ## ends on empty string
-	
-
-	def __parse_string(self, args):
-		i = 0
-		while True:
-			i +=1
-			if args[i] == "\"":
-				break
+class Parser:
+	"""
+		Builds the whole program tree in a single pass over the text.
 
-		self.findString(args[1:i])
-		return args[i+1:]
+		Every open form is represented by a table of callbacks:
+			- "string", "integer", "variable": receive the token value
+			- "argument": receives the name heading a new form (None for "()")
+				and returns the callback table of that form
+			- "close" (optional): called when the form's ")" is found
 
+		The parser keeps an explicit stack of these tables, the bottom one
+		being the table given at construction.
+	"""
 
-	def __parse_int(self, args):
-		int_arg = args.split(" ",1)[0]
-			
-		self.findInteger(int_arg)
+	def __init__(self, parser_object_fn):
+		self.callbacks = parser_object_fn
 
-		if len(args.split(" ", 1)) <= 1:
-			return None
-		return args.split(" ", 1)[1]
+	def parse(self, args):
+		if not args:
+			return
+
+		forms = [self.callbacks] # stack of open forms
+		tokens = tokenize(args)
+
+		for token in tokens:
+			form = forms[-1]
+			if token.kind == "open":
+				self.__parse_call(forms, tokens)
+			elif token.kind == "close":
+				if len(forms) == 1:
+					raise Exception("Incompatible parenthesis")
+				self.__close(forms.pop())
+			elif token.kind == "string":
+				form["string"](token.value)
+			elif token.kind == "variable":
+				form["variable"](token.value)
+			else:
+				form["integer"](token.value)
 
+		if len(forms) > 1:
+			raise Exception("Incompatible parenthesis")
 
-	def __parse_var(self, args):
-		arg_and_more = args.split(" ", 1) 
-		self.findVariable(arg_and_more[0])
+	def __parse_call(self, forms, tokens):
+		head = next(tokens, None)
+		if head is None:
+			raise Exception("Incompatible parenthesis")
 
-		if len(arg_and_more) <= 1:
-			return None
-		return arg_and_more[1]
+		if head.kind == "close": ## ()
+			self.__close(forms[-1]["argument"](None))
+		elif head.kind == "variable": ## (add 1 2
+			forms.append(forms[-1]["argument"](head.value))
+		else:
+			raise Exception("Identifier '{}' not found.".format(repr(head.value)))
+
+	def __close(self, form):
+		close = form.get("close")
+		if close:
+			close()
+
+
+def read_forms(stream, chunk_size=1 << 16):
+	"""
+		Reads the top-level forms of a program one at a time, without
+		loading the whole source in memory.
+
+		@arg stream 		file object or mmap, anything with a read(size) method
+		@arg chunk_size 	(optional) minimum number of characters read at a time
+
+		@returns 	generator with the source text of every top-level form
+	"""
+	buf = ""
+	pos = 0 		# scanning cursor
+	start = None 	# start of the form being read
+	depth = 0
+	eof = False
+
+	while True:
+		m = TOKEN_RE.match(buf, pos)
+
+		# the token may continue in the next chunk
+		if not eof and (not m or (m.end() == len(buf) and m.lastgroup in ("space", "comment", "atom"))):
+			cut = pos if start is None else start
+			chunk = stream.read(max(chunk_size, len(buf) - cut))
+			eof = not chunk
+			buf = buf[cut:] + chunk
+			pos -= cut
+			start = None if start is None else 0
+			continue
+
+		if not m:
+			if pos < len(buf):
+				raise Exception("Unterminated string starting at offset {}".format(pos))
+			break
+
+		kind = m.lastgroup
+		token_start, pos = m.span()
+
+		if kind == "space" or kind == "comment":
+			continue
+
+		if start is None:
+			start = token_start
+
+		if kind == "open":
+			depth += 1
+			continue
+		elif kind == "close":
+			depth -= 1
+			if depth < 0:
+				raise Exception("Incompatible parenthesis")
+
+		if not depth:
+			yield buf[start:pos]
+			start = None
+
+	if depth:
+		raise Exception("Incompatible parenthesis")
@@ -0,0 +1,104 @@
+import os
+import json
+import stat
+import time
+import errno
+import socket
+import hashlib
+import threading
+from collections import OrderedDict
+from SocketServer import ThreadingMixIn, UnixStreamServer, StreamRequestHandler
+
+
+class CompileHandler(StreamRequestHandler):
+	"""
+		Connection of a client, it sends one request per line and gets a response line for each
+	"""
+
+	def handle(self):
+		for line in iter(self.rfile.readline, ""):
+			try:
+				response = self.server.handle_request_line(line)
+			except Exception as error:
+				response = {"error": str(error) or type(error).__name__}
+			self.wfile.write(json.dumps(response) + "\n")
+			self.wfile.flush()
+
+
+class CompileServer(ThreadingMixIn, UnixStreamServer):
+	"""
+		Compile server listening on a Unix socket (whisper.py --serve), so the compiler
+		is loaded once for any number of compilations. Each client gets a thread, 
+		the requests and responses are json objects, one per line (see wp.client):
+
+			request: {"path": source file, or "source": text, "options": {"optimize": true, ...}}
+			response: {"code": C file, "seconds": time spent, "cached": bool} or {"error": message}
+
+		The C files are kept in memory by source and options, the least recently used 
+		are dropped past max_entries.
+
+		- requests, hits : counters for this server
+	"""
+	daemon_threads = True
+
+	def __init__(self, path, compile, max_entries=256):
+		"""
+			@arg path 		path of the socket, a socket left there by a server that stopped is 
+							replaced, socket.error is raised if a server is still listening on it
+			@arg compile 	function compiling (source text, options dict) to the C file
+		"""
+		if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+			probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			try:
+				probe.connect(path)
+			except socket.error:
+				os.remove(path)
+			else:
+				raise socket.error(errno.EADDRINUSE, "a server is already listening on " + path)
+			finally:
+				probe.close()
+		UnixStreamServer.__init__(self, path, CompileHandler)
+
+		self.compile = compile
+		self.max_entries = max_entries
+		self.compiled = OrderedDict() # key: C file
+		self.lock = threading.Lock()
+		self.requests = 0
+		self.hits = 0
+
+	def handle_request_line(self, line):
+		start = time.time()
+		request = json.loads(line)
+		options = request.get("options") or {}
+
+		if "source" in request:
+			source = request["source"].encode("utf-8")
+		else:
+			with open(request["path"]) as f:
+				source = f.read()
+
+		key = hashlib.sha256(repr(sorted(options.items())))
+		key.update(source)
+		key = key.hexdigest()
+
+		with self.lock:
+			self.requests += 1
+			code = self.compiled.pop(key, None)
+			if code is not None:
+				self.hits += 1
+				self.compiled[key] = code
+
+		cached = code is not None
+		if not cached:
+			code = self.compile(source, options)
+			with self.lock:
+				self.compiled[key] = code
+				while len(self.compiled) > self.max_entries:
+					self.compiled.popitem(last=False)
+
+		return {"code": code, "seconds": time.time() - start, "cached": cached}
+
+	def server_close(self):
+		UnixStreamServer.server_close(self)
+		if os.path.exists(self.server_address):
+			os.remove(self.server_address)
@@ -0,0 +1,117 @@
+"""
+	Profiling hooks of the compiler.
+
+	Each phase of a compilation (parse, optimize, resolve, infer, compile, emit) runs inside
+	phase(name), the hooks attached with add_hook are called when it starts and ends,
+	a phase runs once for each top-level form when the forms are compiled one at a time.
+	Counters (nodes, scopes, variants, ...) are given to the hooks with count(name, value).
+
+	A profiler is attached by adding a Hook:
+
+		class Profiler(stats.Hook):
+			def enter(self, phase): ...
+			def leave(self, phase): ...
+
+		stats.add_hook(Profiler())
+"""
+import time
+import resource
+from collections import OrderedDict
+
+
+_hooks = []
+
+
+def add_hook(hook):
+	_hooks.append(hook)
+
+
+def remove_hook(hook):
+	_hooks.remove(hook)
+
+
+def active():
+	"""
+		@returns 	True if a hook is attached, counters are only computed for hooks
+	"""
+	return bool(_hooks)
+
+
+class phase(object):
+	"""
+		Context manager around a phase of the compilation
+	"""
+	__slots__ = ("name",)
+
+	def __init__(self, name):
+		self.name = name
+
+	def __enter__(self):
+		for hook in _hooks:
+			hook.enter(self.name)
+
+	def __exit__(self, *exc_info):
+		for hook in reversed(_hooks):
+			hook.leave(self.name)
+		return False
+
+
+def count(name, value=1):
+	for hook in _hooks:
+		hook.count(name, value)
+
+
+class Hook(object):
+	"""
+		Receives the phases and counters of the compilations, does nothing by default
+	"""
+
+	def enter(self, phase):
+		pass
+
+	def leave(self, phase):
+		pass
+
+	def count(self, name, value):
+		pass
+
+
+def peak_memory():
+	"""
+		@returns 	peak resident memory of the process, in kilobytes (on linux)
+	"""
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Stats(Hook):
+	"""
+		Wall time and growth of the peak memory of each phase (summed over its runs),
+		and the counters, reported by whisper.py --stats
+
+		- phases : {name: [seconds, kilobytes]}
+		- counters : {name: value}
+	"""
+
+	def __init__(self):
+		self.phases = OrderedDict()
+		self.counters = OrderedDict()
+		self.started = []
+
+	def enter(self, phase):
+		self.started.append((time.time(), peak_memory()))
+
+	def leave(self, phase):
+		start, memory = self.started.pop()
+		totals = self.phases.setdefault(phase, [0.0, 0])
+		totals[0] += time.time() - start
+		totals[1] += peak_memory() - memory
+
+	def count(self, name, value):
+		self.counters[name] = self.counters.get(name, 0) + value
+
+	def report(self, out):
+		out.write("{:<10} {:>9} {:>9}\n".format("phase", "seconds", "peak kb"))
+		for name, (seconds, memory) in self.phases.items():
+			out.write("{:<10} {:>9.4f} {:>+9}\n".format(name, seconds, memory))
+		for name, value in self.counters.items():
+			out.write("{}: {}\n".format(name, value))
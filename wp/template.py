@@ -1,5 +1,57 @@
+import os
+from string import Formatter
+from collections import namedtuple
+
+# runtime included by every generated program
+RUNTIME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+						"test", "output", "lisp_def.c")
+
+Program = namedtuple('Program', ['protos', 'variables', 'functions', 'main'])
+
+main_template = ("#include <stdio.h>\n"
+				 "#include <string.h>\n"
+				 "#include \"lisp_def.c\"\n\n"
+				 "//prototype definitions\n"
+				 "{protos}\n\n"
+				 "//variable definitions\n"
+				 "{variables}\n\n"
+				 "//function definitions\n"
+				 "{functions}\n\n"
+				 "int main() {{\n"
+				 "\t{main};\n"
+				 "\treturn 0;\n"
+				 "}}")
+
+
+def program(sections):
+	"""
+		@arg sections 	Program with the code of each section
+		@returns 	the C file
+	"""
+	return main_template.format(**sections._asdict())
+
+
+def write(out, sections):
+	"""
+		Writes the C file to out, section by section
+
+		@arg sections 	dict with the separator and the pieces of code of each section
+		@returns 	number of bytes written
+	"""
+	size = 0
+	for text, section, _, _ in Formatter().parse(main_template):
+		out.write(text)
+		size += len(text)
+		if section:
+			separator, pieces = sections[section]
+			for i, piece in enumerate(pieces):
+				if i:
+					out.write(separator)
+					size += len(separator)
+				out.write(piece)
+				size += len(piece)
+	return size
 
 
 def functionCall(function_name, arguments):
     return "{}({})\n".format(function_name, ','.join(arguments))
-
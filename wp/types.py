@@ -1,10 +1,11 @@
 from collections import namedtuple
 
-CType = namedtuple('CType', ['STRING', 'INT', 'VOID', 'NONE'])
+CType = namedtuple('CType', ['STRING', 'INT', 'VECTOR', 'VOID', 'NONE'])
 ctypes = CType(
 	NONE=0,
 	STRING="char*",
 	INT="int",
+	VECTOR="int*",
 	VOID="void"
 )
 